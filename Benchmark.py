@@ -0,0 +1,402 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from Metrics import percentiles
+from Profiles import get_registry
+
+# Pipeline functions timed by the benchmark, by the name they are reported under. Pages are extracted lazily
+# by these functions, so the "read" stage is taken from the per-file metrics instead.
+STAGES = {
+    "spec_method": "spec_method",
+    "quote_method": "quote_method",
+    "warranty_extraction": "warranty_extraction",
+    "weights_summary": "weights_summary",
+    "write_excel": "write_excel",
+}
+
+WORDS = [
+    "CONVENTIONAL", "CHASSIS", "AXLE", "TRUCK", "STEERING", "LOCATION", "SERVICE", "UTILITY", "REPAIR", "MAINTENANCE",
+    "BUSINESS", "SEGMENT", "FIXED", "LOAD", "COMMODITY", "TERRAIN", "DUTY", "CUMMINS", "ENGINE", "ALLISON", "AUTOMATIC",
+    "TRANSMISSION", "PTO", "PROVISION", "SINGLE", "REAR", "FRONT", "DRIVE", "SPRING", "SUSPENSION", "STEEL", "FRAME",
+    "ALUMINUM", "CAB", "BUMPER", "MIRRORS", "HEATED", "LH", "RH", "DUAL", "BATTERY", "FUEL", "TANK", "GALLON", "TIRES",
+    "WHEELS", "DISC", "HUB", "PILOTED", "AIR", "BRAKE", "ABS", "VALVE", "SEAT", "VINYL", "GRAY", "WHITE", "PAINT",
+]
+CODE_CHARS = "0123456789ABCDEFGHJKLMNPRSTUVWXYZ"
+
+
+def write_pdf(path, pages, font_size=8):
+    """
+    Writes a minimal PDF with one Helvetica text line per entry, enough for pypdf to extract the same lines.
+
+    Parameters:
+    path (str): The path of the PDF file to write.
+    pages (list of list of str): The text lines of each page.
+    font_size (int, optional): The font size. Defaults to 8.
+
+    Returns:
+    None
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for lines in pages:
+        operators = ["BT", f"/F1 {font_size} Tf", f"{font_size + 2} TL", "36 756 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operators.append(f"({escaped}) Tj T*")
+        operators.append("ET")
+        stream = "\n".join(operators).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def header_lines(rng, page_number, page_count):
+    """
+    Builds the "Prepared for:" block printed at the top of every page of the sample documents.
+
+    Parameters:
+    rng (Random): The random generator.
+    page_number (int): The number of the page.
+    page_count (int): The number of pages in the document.
+
+    Returns:
+    list of str: The header lines.
+    """
+    return [
+        "Prepared for:",
+        f"Customer {rng.randint(1, 999)}",
+        "Terex Utilities",
+        "500 Oakwood Rd",
+        "Watertown, SD  57201",
+        "Prepared by:",
+        "Application Version 10.1.105",
+        "Data Version PRL-15M.021",
+        f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2018 1:16 PM",
+        f"Page {page_number} of {page_count}",
+    ]
+
+
+def random_option(rng):
+    """
+    Builds one option line of a specification proposal: data code, description, weights and price.
+
+    Parameters:
+    rng (Random): The random generator.
+
+    Returns:
+    list of str: The option line, followed by a wrapped description line now and then.
+    """
+    code = "".join(rng.choice(CODE_CHARS) for _ in range(3)) + "-" + "".join(rng.choice(CODE_CHARS) for _ in range(3))
+    description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 7)))
+    line = f" {code} {description}"
+    if rng.random() < 0.4:
+        line += f"  {rng.randint(1, 900)}  {rng.randint(1, 900)}"
+        if rng.random() < 0.5:
+            line += f"  ${rng.randint(1, 9)},{rng.randint(0, 999):03d}.00"
+    lines = [line + "   "]
+    if rng.random() < 0.2:
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) + "   ")
+    return lines
+
+
+def spec_pages(rng, options, lines_per_page=60):
+    """
+    Builds the pages of a synthetic specification proposal modeled on "Commander 4047 ... Specs.pdf".
+
+    Parameters:
+    rng (Random): The random generator.
+    options (int): The number of options in the specification.
+    lines_per_page (int, optional): The number of body lines per page. Defaults to 60.
+
+    Returns:
+    list of list of str: The body lines of each page, without page headers.
+    """
+    headings = get_registry().get("spec").get("headings")
+    body = ["D I M E N S I O N S", "VEHICLE SPECIFICATIONS SUMMARY - DIMENSIONS", "Model ......... M2106"]
+    body += ["SP E C I F I C A T I O N  PR O P O S A L", "Data Code", "Description   Weight", "Front  Weight", "Rear",
+             "Retail Price"]
+    per_heading = max(1, options // len(headings))
+    remaining = options
+    for heading in headings:
+        if remaining <= 0:
+            break
+        body.append(heading + "  ")
+        for _ in range(min(per_heading, remaining)):
+            body += random_option(rng)
+            remaining -= 1
+    front, rear = rng.randint(6000, 9000), rng.randint(3000, 6000)
+    body += [
+        "T O T A L  V E H I C L E  S U M M A R Y",
+        "Weight Summary",
+        f"Factory Weight+ {front} lbs  {rear} lbs  {front + rear} lbs",
+        f"Total Weight+ {front} lbs  {rear} lbs  {front + rear} lbs",
+        "Extended Warranty",
+        " WAG-009 TOWING: 6 MONTHS/UNLIMITED MILES/KM EXTENDED TOWING",
+        "COVERAGE $550 CAP FEX APPLIES",
+    ]
+    return [body[i:i + lines_per_page] for i in range(0, len(body), lines_per_page)]
+
+
+def quote_pages(rng):
+    """
+    Builds the page of a synthetic quotation modeled on "4-County EPA C4047 Quote.pdf".
+
+    Parameters:
+    rng (Random): The random generator.
+
+    Returns:
+    list of list of str: The body lines of the single quote page, without the page header.
+    """
+    price = rng.randint(60000, 150000)
+    units = rng.randint(1, 5)
+    warranty = rng.choice([0, 100, 550])
+    body = ["Q U O T A T I O N"]
+    body += [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))) for _ in range(12)]
+    body += [
+        " PER UNIT  TOTAL",
+        "TAXES AND FEES   $ 0 $ 0",
+        "OTHER CHARGES   $ 0 $ 0",
+        f" VEHICLE PRICE  TOTAL # OF UNITS ({units})  $ {price:,}  $ {price * units:,}",
+        f"EXTENDED WARRANTY   $ {warranty} $ {warranty * units}",
+        "DEALER INSTALLED OPTIONS   $ 0 $ 0",
+        f"CUSTOMER PRICE BEFORE TAX   $ {price + warranty:,}  $ {(price + warranty) * units:,}",
+    ]
+    return [body]
+
+
+def generate_corpus(corpus_dir, documents, options=250, seed=0):
+    """
+    Generates a synthetic corpus under corpus_dir/inputs/<year>/<model>/, alternating specification
+    proposals and quotations. Documents that already exist are reused, so larger runs extend smaller ones.
+
+    Parameters:
+    corpus_dir (str): The directory of the corpus.
+    documents (int): The number of documents to generate.
+    options (int, optional): The number of options in each specification. Defaults to 250.
+    seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+    list of tuple: (year, model, file_path) of every document, in generation order.
+    """
+    files = []
+    for index in range(documents):
+        year = str(2019 + (index // 2) % 3)
+        model = f"WO{index // 2:05d}"
+        is_spec = index % 2 == 0
+        directory = os.path.join(corpus_dir, "inputs", year, model)
+        file_path = os.path.join(directory, "Specs.pdf" if is_spec else "Quote.pdf")
+        files.append((year, model, file_path))
+        if os.path.exists(file_path):
+            continue
+
+        rng = random.Random(f"{seed}-{index}")
+        bodies = spec_pages(rng, options) if is_spec else quote_pages(rng)
+        pages = [header_lines(rng, number, len(bodies)) + body for number, body in enumerate(bodies, 1)]
+        os.makedirs(directory, exist_ok=True)
+        write_pdf(file_path, pages)
+    return files
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process.
+
+    Returns:
+    float: The peak RSS in MiB, or None where the resource module is unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_pipeline(files, output_dir):
+    """
+    Runs start() on every file and times each pipeline stage. Meant to run in a fresh process so the
+    peak RSS belongs to this run only.
+
+    Parameters:
+    files (list of tuple): (year, model, file_path) of the documents to process.
+    output_dir (str): The directory the Excel outputs and the caches of the run are written to.
+
+    Returns:
+    dict: documents, pages, seconds, pages_per_second, documents_per_second, failures, peak_rss_mb and
+    per-stage latency percentiles.
+    """
+    os.environ["EXTRACTION_OUTPUT_DIR"] = output_dir
+    # An empty extracted-text cache per run, so every run parses the PDFs instead of reading a cache warmed
+    # by earlier runs or smaller sizes of the same corpus.
+    os.environ["TEXT_CACHE_DIR"] = os.path.join(output_dir, "text-cache")
+    # Likewise the table reuse cache, which would otherwise let later runs skip extraction altogether and
+    # write into the cache/tables of the checkout.
+    os.environ["REUSE_CACHE_DIR"] = os.path.join(output_dir, "reuse-cache")
+    import Extraction
+
+    timings = {"read": []}
+    timings.update({stage: [] for stage in STAGES})
+    counts = {"pages": 0}
+
+    def timed(stage, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = function(*args, **kwargs)
+            timings[stage].append(time.perf_counter() - started)
+            return result
+        return wrapper
+
+    def counted(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            document = function(*args, **kwargs)
+            counts["pages"] += document.page_count
+            return document
+        return wrapper
+
+    for stage, name in STAGES.items():
+        setattr(Extraction, name, timed(stage, getattr(Extraction, name)))
+    Extraction.open_document = counted(Extraction.open_document)
+
+    failures = 0
+    started = time.perf_counter()
+    for year, model, file_path in files:
+        result = Extraction.process_file(model, year, file_path, reuse=False)
+        if "error" in result:
+            failures += 1
+        # Opening the PDF and extracting its pages, wherever the pages were first needed.
+        timings["read"].append(result["metrics"]["stages"].get("read", 0.0))
+    seconds = time.perf_counter() - started
+
+    return {
+        "documents": len(files),
+        "pages": counts["pages"],
+        "seconds": seconds,
+        "pages_per_second": counts["pages"] / seconds if seconds else None,
+        "documents_per_second": len(files) / seconds if seconds else None,
+        "failures": failures,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {stage: percentiles(values) for stage, values in timings.items()},
+    }
+
+
+def compare(previous, current):
+    """
+    Prints the change in throughput and stage latencies between two benchmark result files.
+
+    Parameters:
+    previous (dict): The earlier benchmark results.
+    current (dict): The new benchmark results.
+
+    Returns:
+    None
+    """
+    earlier_runs = {run["documents"]: run for run in previous.get("runs", [])}
+    for run in current["runs"]:
+        earlier = earlier_runs.get(run["documents"])
+        if earlier is None:
+            continue
+        print(f"{run['documents']} documents:")
+        if earlier["pages_per_second"] and run["pages_per_second"]:
+            change = (run["pages_per_second"] / earlier["pages_per_second"] - 1) * 100
+            print(f"  pages/sec   {earlier['pages_per_second']:10.1f} -> {run['pages_per_second']:10.1f} "
+                  f"({change:+.1f}%)")
+        else:
+            print(f"  pages/sec   {earlier['pages_per_second']} -> {run['pages_per_second']} (no pages to compare)")
+        for stage, stats in run["stages"].items():
+            before = earlier["stages"].get(stage, {})
+            if not stats.get("count") or not before.get("count"):
+                continue
+            for key in ("p50", "p95"):
+                change = (stats[key] / before[key] - 1) * 100 if before[key] else 0
+                print(f"  {stage:<20} {key} {before[key]:9.2f} ms -> {stats[key]:9.2f} ms ({change:+.1f}%)")
+
+
+def print_run(run):
+    """
+    Prints the summary of one benchmark run.
+
+    Parameters:
+    run (dict): A result as returned by run_pipeline().
+
+    Returns:
+    None
+    """
+    print(f"{run['documents']} documents, {run['pages']} pages in {run['seconds']:.2f}s: "
+          f"{run['pages_per_second']:.1f} pages/sec, peak RSS {run['peak_rss_mb']} MiB, {run['failures']} failures")
+    for stage, stats in run["stages"].items():
+        if stats.get("count"):
+            print(f"  {stage:<20} n={stats['count']:<6} p50={stats['p50']:8.2f} ms  p95={stats['p95']:8.2f} ms  "
+                  f"p99={stats['p99']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline on a synthetic spec/quote corpus.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Corpus sizes (number of documents) to benchmark.")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "extraction-benchmark-corpus"),
+                        help="Directory of the generated corpus, reused between runs.")
+    parser.add_argument("--options", type=int, default=250, help="Number of options per specification.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the corpus.")
+    parser.add_argument("--output", default=None, help="Path of the JSON results file.")
+    parser.add_argument("--compare", default=None, help="Earlier JSON results file to compare against.")
+    args = parser.parse_args()
+
+    all_files = generate_corpus(args.corpus_dir, max(args.sizes), args.options, args.seed)
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": args.options,
+        "seed": args.seed,
+        "runs": [],
+    }
+    context = multiprocessing.get_context("spawn")
+    for size in sorted(args.sizes):
+        with tempfile.TemporaryDirectory() as output_dir, context.Pool(1) as pool:
+            run = pool.apply(run_pipeline, (all_files[:size], output_dir))
+        print_run(run)
+        results["runs"].append(run)
+
+    output = args.output or f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
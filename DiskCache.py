@@ -0,0 +1,153 @@
+import os
+import tempfile
+
+
+class DiskCache:
+    """
+    Persistent key-value cache with one file per entry under directory, sharded by the first two characters
+    of the key. Reads refresh a file's modification time and the least recently used entries are evicted
+    once the cache grows past max_bytes. The total size is kept in a .size file updated by every put(), so
+    opening the cache does not walk it; evict() recounts it from the entries.
+
+    Subclasses set suffix and define key(), encode() and decode(); see OcrCache, TextCache and
+    Fingerprint.ReuseCache.
+
+    Attributes:
+    directory (str): The cache directory.
+    max_bytes (int): The size the cache is trimmed back to.
+    """
+
+    suffix = '.bin'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def _size_path(self):
+        return os.path.join(self.directory, '.size')
+
+    def _read_size(self):
+        try:
+            with open(self._size_path(), 'r', encoding='utf-8') as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, path, data):
+        fd, temp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def encode(self, value):
+        """
+        Converts a cached value to the bytes stored on disk.
+
+        Parameters:
+        value (bytes): The value.
+
+        Returns:
+        bytes: The value unchanged.
+        """
+        return value
+
+    def decode(self, data):
+        """
+        Converts the bytes stored on disk back to the cached value.
+
+        Parameters:
+        data (bytes): The stored bytes.
+
+        Returns:
+        bytes: The bytes unchanged.
+        """
+        return data
+
+    def get(self, key):
+        """
+        Looks up a cached value.
+
+        Parameters:
+        key (str): The cache key.
+
+        Returns:
+        object: The decoded value, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return self.decode(data)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entries if the cache is over its size limit.
+
+        Parameters:
+        key (str): The cache key.
+        value (object): The value, as accepted by encode().
+
+        Returns:
+        None
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        data = self.encode(value)
+        self._write(path, data)
+        # Processes sharing the cache may race on the size file; evict() corrects any drift.
+        size = self._read_size()
+        if size is None:
+            size = sum(entry[1] for entry in self._entries())
+        else:
+            size += len(data) - replaced
+        if size > self.max_bytes:
+            self.evict()
+        else:
+            self._write(self._size_path(), str(size).encode('utf-8'))
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is back under 90% of max_bytes.
+
+        Returns:
+        None
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._write(self._size_path(), str(total).encode('utf-8'))
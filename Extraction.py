@@ -1,33 +1,447 @@
 import re
+import hashlib
+import itertools
 from pypdf import PdfReader 
 import csv
-import pandas as pd
+import json
+import sys
 import os
-import shutil
+import tempfile
+import argparse
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Manifest import Manifest
+from Profiles import get_registry
+from ResultStore import SqliteStore
+from Rollup import RollupWriter, SHEETS
+from TextCache import get_default_cache as get_text_cache
+import Metrics
+
+# Bump whenever the extraction code changes so that incremental runs reprocess every file. Changes to
+# profiles.json are picked up by extractor_version() without a bump.
+EXTRACTOR_VERSION = "2"
+
+# Leading pages searched for the document type markers by the command line tools. Spec packs carry the
+# "Specification Proposal" title on their third page, after the cover pages.
+CLASSIFY_PAGES = 3
+
+# Result table name -> record fields. Warranty rows have the columns of the Spec rows they are written with.
+RECORD_COLUMNS = {
+    "Spec": SHEETS["Spec"], "Warranty": SHEETS["Spec"], "Quote": SHEETS["Quote"],
+    "WeightSummary": SHEETS["WeightSummary"],
+}
+
+
+class ExtractionError(Exception):
+    """
+    Raised by extract_document() for a file that could not be processed, e.g. because it is missing or is
+    not a readable PDF.
+    """
 
 
-def start(model, year, file_path):
+def extractor_version():
+    """
+    Returns the version of the extraction rules in use, recorded in and checked against the manifest:
+    EXTRACTOR_VERSION followed by a hash of the loaded profiles, so editing the headings, crops or line
+    item mode in profiles.json also reprocesses every file.
+
+    Returns:
+    str: The version, e.g. "2+1f3c5a7b9d2e".
+    """
+    return f"{EXTRACTOR_VERSION}+{get_registry().digest[:12]}"
+
+
+_rules_version = None
+
+
+def rules_version():
+    """
+    Returns the version reused tables are keyed on: extractor_version() followed by a hash of the source of
+    the extraction modules, so an edit to the rule code itself invalidates the reused tables even without an
+    EXTRACTOR_VERSION bump.
+
+    Returns:
+    str: The version, e.g. "2+1f3c5a7b9d2e+0a4e6c8d1b3f".
+    """
+    global _rules_version
+    if _rules_version is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in ("Extraction.py", "Layout.py", "Profiles.py"):
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(f.read())
+        _rules_version = digest.hexdigest()[:12]
+    return f"{extractor_version()}+{_rules_version}"
+
+
+def start(model, year, file_path, ocr=False, excel=True, classify_pages=None, reuse=False, fingerprint=False):
     """
     Starts the process by reading a file and determining whether to use the spec_method or quote_method.
+    The PDF is parsed once and the resulting document is shared by every extraction stage. The document
+    type is determined by the markers of the profiles in profiles.json; with classify_pages, only the
+    metadata and the first pages are searched and documents of an unknown type are not parsed further.
 
     Parameters:
     model (str): The model of the item.
     year (int): The year associated with the file.
     file_path (str): The path to the PDF file.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    excel (bool, optional): Write the per-work-order Excel files. Defaults to True.
+    classify_pages (int, optional): The number of leading pages searched for the type markers. Defaults to
+    None, which searches the whole document.
+    reuse (bool, optional): Fingerprint identified documents and reuse the tables of a document with the same
+    body already extracted by the current rules and rule code (see rules_version()), by this or any other
+    process sharing the reuse cache (see Fingerprint.ReuseCache). Fingerprinting extracts, and in hybrid mode
+    OCRs, every page. Defaults to False.
+    fingerprint (bool, optional): Also fingerprint identified documents extracted without reuse, e.g. to report
+    duplicates. Only the pages the extraction already read are fingerprinted, so no page is extracted or OCRed
+    for it. Defaults to False.
 
     Returns:
-    None
+    dict: The file_path, year, model, detected document type (the profile name, e.g. "spec" or "quote",
+    or None), the extracted tables keyed by output name ("Spec", "Warranty", "WeightSummary", "Quote") and,
+    for identified documents extracted with reuse or fingerprint, the body "fingerprint" (see
+    Fingerprint.fingerprint()).
     """
-    page_text = read(file_path)
-    stripped_text = page_text.lower().replace(" ", "")
-    if("quotation" in stripped_text):
-        quote_method(file_path, model, year)
-    elif ("specificationproposal" in stripped_text):
-        spec_method(file_path, model, year)
-    else:
-        print("UNable to Identify File Types")
+    result = {"file_path": file_path, "year": year, "model": model, "type": None, "tables": {}}
+    document = open_document(file_path, ocr)
+    if document.error is not None:
+        # Unlike a document of an unknown type, a file that cannot be opened is a failure.
+        Metrics.count("failures")
+        result["error"] = f"{type(document.error).__name__}: {document.error}"
+        return result
+    try:
+        profile = classify_document(document, classify_pages)
+        if profile is None:
+            print("UNable to Identify File Types")
+            return result
+
+        result["type"] = profile.name
+        tables = None
+        reuse_key = None
+        if reuse:
+            # Imported here so single-document callers do not load numpy.
+            import Fingerprint
+            with Metrics.stage("fingerprint"):
+                digest, signature = Fingerprint.fingerprint(document.pages)
+                result["fingerprint"] = (digest, signature.tolist())
+                reuse_key = Fingerprint.ReuseCache.key(profile.name, digest, rules_version())
+                tables = Fingerprint.get_reuse_cache().claim(reuse_key)
+        if tables is not None:
+            # A reissue of a document already extracted: only the header blocks differ.
+            Metrics.count("reused")
+            result["tables"] = Fingerprint.retag(tables, year, model, file_path)
+            if excel:
+                write_tables(result["tables"], year, model)
+        else:
+            methods = {"quote": quote_method, "spec": spec_method}
+            try:
+                result["tables"] = methods[profile.extractor](file_path, model, year, document, profile, excel) or {}
+                if reuse_key is not None:
+                    Fingerprint.get_reuse_cache().put(reuse_key, result["tables"])
+            finally:
+                if reuse_key is not None:
+                    Fingerprint.get_reuse_cache().release(reuse_key)
+            if fingerprint and not reuse:
+                import Fingerprint
+                with Metrics.stage("fingerprint"):
+                    digest, signature = Fingerprint.fingerprint(document.extracted_pages())
+                    result["fingerprint"] = (digest, signature.tolist())
+        Metrics.count("records", sum(len(rows) for rows in result["tables"].values()))
+        return result
+    finally:
+        # Only the pages the classifier and extractors needed were extracted; cache those for later runs.
+        document.store_text()
+
+
+class ParsedDocument:
+    """
+    Text and metadata of a PDF, extracted once and passed to every extraction stage.
+    A document opened with open_document() extracts its pages lazily: page() extracts a single page,
+    and the full list of pages is only built when pages or text is first used. find_pages() indexes the
+    pages sections start on, so extractors can work on the pages of their section alone.
+
+    Attributes:
+    file_path (str): The path to the PDF file.
+    pages (list of str): Extracted text of each page, an empty string where no text could be extracted.
+    metadata (dict): The PDF document information (title, author, producer, ...).
+    ocr (bool): OCR the pages without extractable text when the pages are extracted.
+    cache_key (str): The key the extracted pages are stored under in the extracted-text cache by store_text(),
+    None if they are not cached.
+    error (Exception): Why the file could not be opened, None if it was.
+    """
+
+    def __init__(self, file_path, pages=None, metadata=None, reader=None, ocr=False, extracted=None, cache_key=None,
+                 error=None):
+        self.file_path = file_path
+        self.error = error
+        self.metadata = metadata if metadata is not None else {}
+        self.ocr = ocr
+        self._reader = reader
+        self.cache_key = cache_key
+        # extracted is the pypdf text of every page as stored in the text cache, None for the pages that were
+        # not extracted before; those are extracted from the file when needed.
+        self._page_count = len(extracted) if extracted is not None else None
+        self._pages = pages if pages is not None or reader is not None or extracted is not None else []
+        self._extracted = {i: text for i, text in enumerate(extracted or []) if text is not None}
+        self._stored = len(self._extracted)
+        self._sections = {}
+        self._text = None
+
+    @property
+    def page_count(self):
+        """
+        int: The number of pages, known without extracting any text.
+        """
+        if self._pages is not None:
+            return len(self._pages)
+        if self._page_count is not None:
+            return self._page_count
+        return len(self._reader.pages)
+
+    def page(self, index):
+        """
+        Returns the text of one page, extracting only that page if the document has not been extracted yet.
+        The page is not OCRed.
+
+        Parameters:
+        index (int): The zero-based index of the page.
+
+        Returns:
+        str: The extracted text, an empty string if the page has none.
+        """
+        if self._pages is not None:
+            return self._pages[index]
+        if index not in self._extracted:
+            with Metrics.stage("read"):
+                self._extracted[index] = self._extract_page(index)
+        return self._extracted[index]
+
+    def _extract_page(self, index):
+        if self._reader is None:
+            # Opened from a text cache entry that lacks this page.
+            self._reader = PdfReader(self.file_path)
+        return self._reader.pages[index].extract_text() or ""
+
+    def store_text(self):
+        """
+        Writes the pypdf text of the pages extracted so far to the extracted-text cache, unless the cache
+        already holds them. Pages that were never extracted are stored as None.
+
+        Returns:
+        None
+        """
+        if self.cache_key is None or len(self._extracted) == self._stored:
+            return
+        pages = [self._extracted.get(i) for i in range(self.page_count)]
+        get_text_cache().put(self.cache_key, {"pages": pages, "metadata": self.metadata})
+        self._stored = len(self._extracted)
+
+    def find_pages(self, keywords):
+        """
+        Finds the first page each keyword occurs on. Pages are extracted in order only until every keyword
+        has been found, and the results are kept so each section is only searched for once.
+
+        Parameters:
+        keywords (list of str): The section keywords, e.g. "T O T A L  V E H I C L E  S U M M A R Y".
+
+        Returns:
+        dict: The zero-based page index of each keyword, or None for keywords that do not occur.
+        """
+        remaining = {keyword for keyword in keywords if keyword not in self._sections}
+        for index in range(self.page_count if remaining else 0):
+            text = self.pages[index] if self.ocr else self.page(index)
+            for keyword in [keyword for keyword in remaining if keyword in text]:
+                self._sections[keyword] = index
+                remaining.discard(keyword)
+            if not remaining:
+                break
+        for keyword in remaining:
+            self._sections[keyword] = None
+        return {keyword: self._sections[keyword] for keyword in keywords}
+
+    def page_text(self, first, last):
+        """
+        Joins the text of a range of pages.
+
+        Parameters:
+        first (int): The zero-based index of the first page.
+        last (int): The zero-based index of the last page, included.
+
+        Returns:
+        str: The text of the pages joined together, as it appears in text.
+        """
+        if self._text is not None and first == 0 and last == self.page_count - 1:
+            return self._text
+        return "".join(self.pages[index] if self.ocr else self.page(index) for index in range(first, last + 1))
+
+    def extracted_pages(self):
+        """
+        Returns the text of the pages extracted so far, in page order, without extracting any others.
+
+        Returns:
+        list of str: The text of every page if pages was used, else of the pages read by page() so far.
+        """
+        if self._pages is not None:
+            return self._pages
+        return [self._extracted[index] for index in sorted(self._extracted)]
+
+    @property
+    def pages(self):
+        """
+        list of str: The text of every page, extracted (and OCRed in hybrid mode) on first use.
+        """
+        if self._pages is None:
+            self._pages = self._extract_pages()
+            self._reader = None
+        return self._pages
+
+    @property
+    def text(self):
+        """
+        str: The text of all pages joined together, built on first use.
+        """
+        if self._text is None:
+            self._text = "".join(self.pages)
+        return self._text
+
+    def _extract_pages(self):
+        try:
+            with Metrics.stage("read"):
+                for i in range(self.page_count):
+                    if i not in self._extracted:
+                        self._extracted[i] = self._extract_page(i)
+                pages = [self._extracted[i] for i in range(self.page_count)]
+                self.store_text()
+
+            empty_pages = [i for i, text in enumerate(pages) if not text]
+            if self.ocr and empty_pages:
+                with Metrics.stage("ocr"):
+                    for i, text in ocr_pages(self.file_path, empty_pages).items():
+                        pages[i] = text
+                Metrics.count("ocr_pages", len(empty_pages))
+
+            for i in empty_pages:
+                if not pages[i]:
+                    Metrics.count("warnings")
+                    print(f"Warning: Unable to extract text from page {i + 1} in {os.path.basename(self.file_path)}")
+            Metrics.count("lines", sum(text.count('\n') + 1 for text in pages if text))
+            return pages
+        except MemoryError:
+            raise
+        except Exception as e:
+            print(f"Error processing file {os.path.basename(self.file_path)}: {e}")
+            return []
+
+
+def open_document(file_path, ocr=False, use_cache=True):
+    """
+    Opens a PDF file and reads its metadata without extracting any page text.
+    The extracted-text cache is consulted first: pages of a PDF extracted before by the same pypdf version
+    are not parsed again. Newly extracted pages are written to the cache by ParsedDocument.store_text().
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    ocr (bool, optional): OCR the pages without extractable text once the pages are extracted. Defaults to False.
+    use_cache (bool, optional): Read and update the extracted-text cache. Defaults to True.
+
+    Returns:
+    ParsedDocument: The lazily extracted document. If the file cannot be opened, it has no pages and its error
+    is set.
+    """
+    try:
+        with Metrics.stage("read"):
+            cache_key = None
+            if use_cache:
+                cache_key = get_text_cache().key(file_path)
+                entry = get_text_cache().get(cache_key)
+                if entry is not None:
+                    Metrics.count("text_cache_hits")
+                    Metrics.count("pages", len(entry["pages"]))
+                    return ParsedDocument(file_path, metadata=entry["metadata"], ocr=ocr, extracted=entry["pages"],
+                                          cache_key=cache_key)
+            reader = PdfReader(file_path)
+            metadata = {key.lstrip('/'): str(value) for key, value in (reader.metadata or {}).items()}
+            Metrics.count("pages", len(reader.pages))
+        return ParsedDocument(file_path, metadata=metadata, reader=reader, ocr=ocr, cache_key=cache_key)
+    except FileNotFoundError as e:
+        print(f"Error: The file {os.path.basename(file_path)} was not found.")
+        return ParsedDocument(file_path, error=e)
+    except MemoryError:
+        # Not a problem with the file itself; let process_file() report it so the file can be retried.
+        raise
+    except Exception as e:
+        print(f"Error processing file {os.path.basename(file_path)}: {e}")
+        return ParsedDocument(file_path, error=e)
+
+
+def parse_document(file_path, ocr=False, use_cache=True):
+    """
+    Parses a PDF file once, keeping the text of every page and the document metadata.
+    In hybrid mode (ocr=True) the pages pypdf cannot extract text from are rasterized and OCRed in
+    parallel, and their text is merged back in page order.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    ocr (bool, optional): OCR the pages without extractable text. Defaults to False.
+    use_cache (bool, optional): Read and update the extracted-text cache. Defaults to True.
+
+    Returns:
+    ParsedDocument: The parsed document, with no pages if an error occurs.
+    """
+    document = open_document(file_path, ocr, use_cache)
+    document.pages
+    return document
+
+
+def classify_document(document, max_pages=None):
+    """
+    Determines the document type from the markers of the profiles in profiles.json.
+    With max_pages, only the title and subject in the PDF metadata and the first max_pages pages are
+    extracted and searched, so documents of an unknown type are rejected without a full parse. If one
+    of those pages has no text and the document is OCRed, the whole document is searched instead.
+
+    Parameters:
+    document (ParsedDocument): The document, ideally opened with open_document().
+    max_pages (int, optional): The number of leading pages to search. Defaults to None, which searches every page.
+
+    Returns:
+    Profile: The matching profile, or None if no marker is found.
+    """
+    registry = get_registry()
+    if not max_pages:
+        return registry.classify(document.text)
+    texts = [document.metadata.get("Title", ""), document.metadata.get("Subject", "")]
+    texts += [document.page(i) for i in range(min(max_pages, document.page_count))]
+    if document.ocr and not all(texts[2:]):
+        return registry.classify(document.text)
+    return registry.classify("\n".join(texts))
 
 
+def ocr_pages(file_path, page_numbers, workers=None):
+    """
+    OCRs pages of a PDF with PhotoExtraction, which needs PyMuPDF and Tesseract. They are imported on
+    first use so text-only runs do not depend on them.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    page_numbers (list of int): The zero-based indexes of the pages to OCR.
+    workers (int, optional): Number of OCR processes. Defaults to None: 1 when this already runs in a worker
+    process of a batch, watcher, supervisor or service pool, which runs one file per CPU, and the number of
+    CPUs otherwise.
+
+    Returns:
+    dict: The recognised text keyed by page index, empty if the OCR dependencies are missing.
+    """
+    try:
+        import PhotoExtraction
+    except ImportError as e:
+        print(f"Warning: OCR is unavailable ({e}); skipping {len(page_numbers)} pages in {os.path.basename(file_path)}")
+        return {}
+    if workers is None and multiprocessing.parent_process() is not None:
+        workers = 1
+    return PhotoExtraction.ocr_pages(file_path, page_numbers, workers)
 
 
 def read(file_path):
@@ -40,23 +454,7 @@ def read(file_path):
     Returns:
     str: Extracted text from the PDF, or an empty string if an error occurs.
     """
-    try:
-        reader = PdfReader(file_path)
-        num_pages = len(reader.pages)
-        page_text = ""
-        for i in range(num_pages):
-            page = reader.pages[i]
-            text = page.extract_text()
-            if text:
-                page_text += text
-            else:
-                print(f"Warning: Unable to extract text from page {i + 1} in {os.path.basename(file_path)}")
-        return page_text
-    except FileNotFoundError:
-        print(f"Error: The file {os.path.basename(file_path)} was not found.")
-    except Exception as e:
-        print(f"Error processing file {os.path.basename(file_path)}: {e}")
-    return ""
+    return parse_document(file_path).text
 
 
 def crop_pdf(input_string, keyword1, keyword2):
@@ -108,127 +506,164 @@ def crop_pdf2(input_string, keyword, n=None):
     return result
 
 
-def cleaning2(text, keyword1, keyword2, keyword3):
+def crop_pages(document, keyword1, keyword2):
     """
-    Cleans text by removing unwanted lines between specific keywords.
+    Crops text between two keywords like crop_pdf(), but only joins the pages from the first page
+    containing keyword1 to the first page containing keyword2 instead of the whole document.
 
     Parameters:
-    text (str): The text to be cleaned.
-    keyword1 (str): The first keyword to search for.
-    keyword2 (str): The keyword to be removed.
-    keyword3 (str): The fallback keyword to search for if keyword1 is not present.
+    document (ParsedDocument): The document to crop.
+    keyword1 (str): The starting keyword for cropping.
+    keyword2 (str): The ending keyword for cropping.
 
     Returns:
-    str: The cleaned text with unnecessary lines and keywords removed.
+    str: The cropped text, or None if keywords are not found or in the wrong order.
     """
-    lines = text.split('\n')
-    i = 0
-    keyword_to_use = keyword1 if keyword1 in text else keyword3
-    while i < len(lines):
-        if lines[i].strip() == keyword_to_use:
-            j = i - 1
-            while j >= 0 and keyword2 not in lines[j]:
-                j -= 1
-            if j >= 0 and keyword2 in lines[j]:
-                lines = lines[:j] + [lines[j].replace(keyword2, '').strip()] + lines[i + 1:]
-                i = j
-                continue
-        i += 1
-    new_text = '\n'.join(lines)
-    return new_text
+    pages = document.find_pages([keyword1, keyword2])
+    first, last = pages[keyword1], pages[keyword2]
+    if first is None or last is None or first > last:
+        return None
+    return crop_pdf(document.page_text(first, last), keyword1, keyword2)
+
+
+def crop_pages2(document, keyword, n=None):
+    """
+    Returns the line containing a keyword and the n lines after it like crop_pdf2(), joining only the
+    pages those lines are on.
 
+    Parameters:
+    document (ParsedDocument): The document to crop.
+    keyword (str): The keyword to locate in the text.
+    n (int, optional): The number of lines to include after the keyword. Defaults to None, which returns all remaining lines.
 
-def remove_empty(text):
+    Returns:
+    str: Cropped text containing the keyword and subsequent lines, or None if the keyword is not found.
     """
-    Removes empty lines from a block of text.
+    page = document.find_pages([keyword])[keyword]
+    if page is None:
+        return None
+    last = page
+    # Pages do not always end with a line break, so the keyword line can start on the previous page; only
+    # that unterminated last line is joined, not the whole previous page.
+    head = ""
+    if page > 0:
+        previous = document.page_text(page - 1, page - 1)
+        head = previous[previous.rfind('\n') + 1:]
+    if n is None:
+        return crop_pdf2(head + document.page_text(page, document.page_count - 1), keyword, n)
+    text = head + document.page_text(page, last)
+    # Add pages until the n lines after the keyword line are complete.
+    while last < document.page_count - 1 and text.count('\n', text.find(keyword)) <= n:
+        last += 1
+        text += document.page_text(last, last)
+    return crop_pdf2(text, keyword, n)
+
+
+def iter_lines(text):
+    """
+    Yields the lines of a text one at a time, split on newline characters, without building a list of
+    every line first.
 
     Parameters:
     text (str): The input text.
 
     Returns:
-    str: The text with all empty lines removed.
+    generator: The lines of the text, without the newline characters.
     """
-    lines = text.split('\n')
-    non_empty_lines = [line for line in lines if line.strip() != '']
-    new_text = '\n'.join(non_empty_lines)
-    return new_text
+    start_index = 0
+    end_index = text.find('\n')
+    while end_index != -1:
+        yield text[start_index:end_index]
+        start_index = end_index + 1
+        end_index = text.find('\n', start_index)
+    yield text[start_index:]
 
 
-def join_gaps(text, predefined_array):
+def drop_page_headers(lines, separator, page_header):
     """
-    Joins lines that should belong together based on a pattern or a predefined array.
+    Removes the repeated page header blocks from a stream of lines. Every line equal to separator is
+    removed together with the lines above it up to the closest line containing page_header, and the
+    page_header keyword is removed from that line.
+    Only the lines after an unmatched page_header line are held back, so memory stays bounded by the
+    size of a page header block.
 
     Parameters:
-    text (str): The input text to process.
-    predefined_array (list of str): Array of predefined patterns to keep separate.
+    lines (iterable of str): The input lines.
+    separator (str): The line that closes a page header block.
+    page_header (str): The keyword that opens a page header block.
 
     Returns:
-    str: The processed text with lines joined based on the pattern or predefined array.
+    generator: The remaining lines.
     """
-    pattern = re.compile(r'^\s*[A-Za-z0-9]{3}-[A-Za-z0-9]{3}')
-    lines = text.split('\n')
-    processed_lines = []
+    pending = []
+    anchors = []
     for line in lines:
-        if pattern.match(line) or line.strip() in predefined_array:
-            processed_lines.append(line)
-        else:
-            if processed_lines:
-                processed_lines[-1] += '' + line.strip()
-            else:
-                processed_lines.append(line.strip())
-    return '\n'.join(processed_lines)
+        while line.strip() == separator and anchors:
+            j = anchors.pop()
+            line = pending[j].replace(page_header, '').strip()
+            del pending[j:]
+        if page_header in line:
+            anchors.append(len(pending))
+        pending.append(line)
+        if not anchors:
+            yield from pending
+            pending.clear()
+    yield from pending
 
 
-def add_heading(text, predefined_array):
+def cleaning2(text, keyword1, keyword2, keyword3):
     """
-    Adds headings to text lines based on predefined keywords.
+    Cleans text by removing unwanted lines between specific keywords.
 
     Parameters:
-    text (str): The input text.
-    predefined_array (list of str): Array of predefined headings.
+    text (str): The text to be cleaned.
+    keyword1 (str): The first keyword to search for.
+    keyword2 (str): The keyword to be removed.
+    keyword3 (str): The fallback keyword to search for if keyword1 is not present.
 
     Returns:
-    str: The text with headings added to the corresponding lines.
+    str: The cleaned text with unnecessary lines and keywords removed.
     """
-    lines = text.split('\n')
-    processed_lines = []
-    current_predefined = None
-    for line in lines:
-        stripped_line = line.strip()
-        if stripped_line in predefined_array:
-            current_predefined = stripped_line
-        else:
-            if current_predefined:
-                processed_lines.append(f"{current_predefined} {line.strip()}")
-            else:
-                processed_lines.append(line)
-    return '\n'.join(processed_lines)
+    keyword_to_use = keyword1 if keyword1 in text else keyword3
+    return '\n'.join(drop_page_headers(text.split('\n'), keyword_to_use, keyword2))
 
 
-def remove_colon_space(text):
+def normalize_spec_lines(lines, headings, separator, page_header):
     """
-    Removes spaces after colons in a block of text.
+    Cleans the lines of a specification proposal in a single streaming pass: page header blocks are
+    dropped, empty lines are skipped, wrapped lines are joined onto the data line they belong to, every
+    data line is prefixed with its heading and spaces after colons are removed.
 
     Parameters:
-    text (str): The input text to process.
+    lines (iterable of str): The lines of the cropped specification text, e.g. from iter_lines().
+    headings (set of str): The section headings of the specification.
+    separator (str): The line that closes a page header block, e.g. "Retail Price".
+    page_header (str): The keyword that opens a page header block, e.g. "Prepared for:".
 
     Returns:
-    str: The text with spaces after colons removed.
+    generator: The cleaned lines, ready for extract().
     """
-    processed_lines = []
-    for line in text.splitlines():
-        processed_line = []
-        i = 0
-        while i < len(line):
-            char = line[i]
-            if char == ':' and i + 1 < len(line) and line[i + 1] == ' ':
-                processed_line.append(char)
-                i += 2  # Increment by 2 to skip the space after the colon
+    pattern = re.compile(r'^\s*[A-Za-z0-9]{3}-[A-Za-z0-9]{3}')
+    current_heading = None
+    record = None
+    for line in itertools.chain(drop_page_headers(lines, separator, page_header), [None]):
+        if line is not None:
+            stripped_line = line.strip()
+            if stripped_line == '':
+                continue
+            if not (pattern.match(line) or stripped_line in headings):
+                record = stripped_line if record is None else record + stripped_line
+                continue
+
+        if record is not None:
+            stripped_record = record.strip()
+            if stripped_record in headings:
+                current_heading = stripped_record
             else:
-                processed_line.append(char)
-                i += 1
-        processed_lines.append(''.join(processed_line))
-    return '\n'.join(processed_lines)
+                if current_heading:
+                    record = f"{current_heading} {stripped_record}"
+                yield from record.replace(': ', ':').splitlines()
+        record = line
 
 
 def extract(text, headings, model, year, file_path):
@@ -236,8 +671,8 @@ def extract(text, headings, model, year, file_path):
     Extracts structured data from text based on a pattern and headings.
 
     Parameters:
-    text (str): The input text.
-    headings (list of str): A list of valid headings to look for.
+    text (str or iterable of str): The input text, or its lines.
+    headings (set of str): The valid headings to look for.
     model (str): The model of the item.
     year (int): The year associated with the data.
     file_path (str): The file path of the document being processed.
@@ -247,7 +682,8 @@ def extract(text, headings, model, year, file_path):
     """
     pattern = re.compile(r'^\s*(.*?)\s+([A-Za-z0-9]{3}\s*-\s*[A-Za-z0-9]{3})')
     extracted_data = []
-    for line in text.splitlines():
+    lines = text.splitlines() if isinstance(text, str) else text
+    for line in lines:
         match = pattern.match(line)
         if not match:
             continue
@@ -288,8 +724,38 @@ def extract(text, headings, model, year, file_path):
     return extracted_data
 
 
-def quote_extract(text, model, year, file_path):
-    text = crop_pdf2(text, "VEHICLE PRICE")
+def layout_extract(document, profile, model, year, file_path):
+    """
+    Extracts the line items of a specification proposal by the position of each word with Layout, which
+    needs PyMuPDF. It is imported on first use so the text rules do not depend on it.
+
+    Parameters:
+    document (ParsedDocument): The parsed PDF, used to find the pages of the proposal.
+    profile (Profile): The document type profile, with the "layout_columns" header labels.
+    model (str): The model of the item.
+    year (str): The year associated with the data.
+    file_path (str): The path to the PDF file.
+
+    Returns:
+    list: The extracted rows like those of extract(), or None if PyMuPDF is missing or the proposal is not
+    found.
+    """
+    try:
+        import Layout
+    except ImportError as e:
+        print(f"Warning: Layout extraction is unavailable ({e}); using the text rules for {os.path.basename(file_path)}")
+        return None
+    keyword1, keyword2 = profile.get("spec_crop")
+    pages = document.find_pages([keyword1, keyword2])
+    first, last = pages[keyword1], pages[keyword2]
+    if first is None or last is None or first > last:
+        return None
+    return Layout.spec_rows(file_path, first, last, profile.headings, profile.get("layout_columns"), keyword2,
+                            profile.get("page_footer"), model, year)
+
+
+def quote_extract(text, model, year, file_path, keyword="VEHICLE PRICE"):
+    text = crop_pdf2(text, keyword)
     match = re.search(r'\((\d+)\)', text)
     units = int(match.group(1)) if match else None
     
@@ -312,7 +778,7 @@ def quote_extract(text, model, year, file_path):
     
     return extracted_data
 
-def spec_method(file_path, model, year):
+def spec_method(file_path, model, year, document=None, profile=None, excel=True):
     """
     Processes a specification PDF by extracting and cleaning data, and generating an Excel sheet.
 
@@ -320,56 +786,57 @@ def spec_method(file_path, model, year):
     file_path (str): The path to the PDF file.
     model (str): The model name.
     year (int): The year of the data.
+    document (ParsedDocument, optional): The already parsed PDF. Parsed from file_path if not provided.
+    profile (Profile, optional): The document type profile. Defaults to the "spec" profile.
+    excel (bool, optional): Write Spec.xlsx and WeightSummary.xlsx. Defaults to True.
 
     Returns:
-    None
+    dict: The extracted "Spec", "Warranty" and "WeightSummary" rows, or 0 if the specification section
+    is not found.
     """
-    original_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs')
-    page_text = read(file_path)  
-    keyword1 = "SP E C I F I C A T I O N  PR O P O S A L"
-    keyword2 = "T O T A L  V E H I C L E  S U M M A R Y"
-    
-    headings = [ 
-        "Price Level", "Data Version", "Interior Convenience/Driver Retention Package", "Vehicle Configuration",
-        "General Service", "Truck Service", "Engine", "Electronic Parameters", "Engine Equipment", "Transmission",
-        "Transmission Equipment", "Front Axle and Equipment", "Front Suspension", "Rear Axle and Equipment",
-        "Rear Suspension", "Brake System", "Trailer Connections", "Wheelbase & Frame", "Chassis Equipment",
-        "Fuel Tanks", "Tires", "Hubs", "Wheels", "Cab Exterior", "Cab Interior", "Instruments & Controls", "Design",
-        "Color", "Certification / Compliance", "Secondary Factory Options", "Sales Programs"
-    ]
-
-    page_text_cropped = crop_pdf(page_text, keyword1, keyword2)  
-    if page_text_cropped is None: 
-        print(file_path)
-        return 0
-
-    page_text_cleaned = cleaning2(page_text_cropped, "Retail Price", "Prepared for:", "Rear")
-    page_text_cleaned = remove_empty(page_text_cleaned)
-    page_text_cleaned = join_gaps(page_text_cleaned, headings)
-    page_text_cleaned = add_heading(page_text_cleaned, headings)
-    page_text_cleaned = remove_colon_space(page_text_cleaned)
-
-    final_array = extract(page_text_cleaned, headings, model, year, file_path)
-    warranty = warranty_extraction(file_path, model, year)
-    final_array += warranty
+    if document is None:
+        document = parse_document(file_path)
+    if profile is None:
+        profile = get_registry().get("spec")
+    keyword1, keyword2 = profile.get("spec_crop")
+    headings = profile.headings
+
+    final_array = None
+    if profile.get("line_items") == "layout":
+        with Metrics.stage("layout"):
+            final_array = layout_extract(document, profile, model, year, file_path)
+
+    if not final_array:
+        with Metrics.stage("crop"):
+            page_text_cropped = crop_pages(document, keyword1, keyword2)  
+        if page_text_cropped is None: 
+            print(file_path)
+            return 0
 
-    final_csv = pd.DataFrame(final_array)
-    final_csv.columns = [
-        "Heading", "Data Code", "Description", "Weight Front", "Weight Rear", "Retail Price", "Year", "Work Order", 
-        "File Path"
-    ]
+        # Cleaning is fused into the line stream consumed by extract(), so both are timed as one stage.
+        with Metrics.stage("clean_extract"):
+            separator, fallback_separator = profile.get("separators")
+            if separator not in page_text_cropped:
+                separator = fallback_separator
+            cleaned_lines = normalize_spec_lines(iter_lines(page_text_cropped), headings, separator, profile.get("page_header"))
+            final_array = extract(cleaned_lines, headings, model, year, file_path)
+    warranty = warranty_extraction(file_path, model, year, document, profile)
 
-    with pd.ExcelWriter('Spec.xlsx') as writer:
-        final_csv.to_excel(writer, index=False)
+    if excel:
+        import pandas as pd
+        final_csv = pd.DataFrame(final_array + warranty)
+        final_csv.columns = [
+            "Heading", "Data Code", "Description", "Weight Front", "Weight Rear", "Retail Price", "Year", "Work Order", 
+            "File Path"
+        ]
 
-    destination_dir = os.path.join(original_path, year, model)
-    os.makedirs(destination_dir, exist_ok=True)
-    shutil.move('Spec.xlsx', os.path.join(destination_dir, 'Spec.xlsx'))
+        write_excel(final_csv, year, model, 'Spec.xlsx')
 
-    weights_summary(file_path, model, year)
+    weights = weights_summary(file_path, model, year, document, profile, excel) or []
+    return {"Spec": final_array, "Warranty": warranty, "WeightSummary": weights}
 
 
-def quote_method(file_path, model, year):
+def quote_method(file_path, model, year, document=None, profile=None, excel=True):
     """
     Processes a quote PDF by extracting relevant data and generating an Excel sheet.
 
@@ -377,29 +844,34 @@ def quote_method(file_path, model, year):
     file_path (str): The path to the PDF file.
     model (str): The model name.
     year (int): The year of the data.
+    document (ParsedDocument, optional): The already parsed PDF. Parsed from file_path if not provided.
+    profile (Profile, optional): The document type profile. Defaults to the "quote" profile.
+    excel (bool, optional): Write Quote.xlsx. Defaults to True.
 
     Returns:
-    None
+    dict: The extracted "Quote" rows, or 0 if no line items are found.
     """
-    original_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs')
-    page_text = read(file_path)
+    if document is None:
+        document = parse_document(file_path)
+    if profile is None:
+        profile = get_registry().get("quote")
+    page_text = document.text
     
-    final_array = quote_extract(page_text, model, year, file_path)
-    final_csv = pd.DataFrame(final_array)
-    
-    if final_csv.empty:
+    with Metrics.stage("extract"):
+        final_array = quote_extract(page_text, model, year, file_path, profile.get("quote_crop"))
+    if not final_array:
         return 0
     
-    #final_csv = final_csv.drop(final_csv.columns[0], axis=1)
-    final_csv.columns = ["Line Items", "Number of Units", "Price per Unit", "Total Price", "Year", "Work Order", "File Path"]
-    with pd.ExcelWriter('Quote.xlsx') as writer:
-        final_csv.to_excel(writer, index=False)
-    destination_dir = os.path.join(original_path, year, model)
-    os.makedirs(destination_dir, exist_ok=True)
-    shutil.move('Quote.xlsx', os.path.join(destination_dir, 'Quote.xlsx'))
+    if excel:
+        import pandas as pd
+        final_csv = pd.DataFrame(final_array)
+        #final_csv = final_csv.drop(final_csv.columns[0], axis=1)
+        final_csv.columns = ["Line Items", "Number of Units", "Price per Unit", "Total Price", "Year", "Work Order", "File Path"]
+        write_excel(final_csv, year, model, 'Quote.xlsx')
+    return {"Quote": final_array}
 
 
-def warranty_extraction(file_path, model, year):
+def warranty_extraction(file_path, model, year, document=None, profile=None):
     """
     Extracts warranty data from a PDF file.
 
@@ -407,27 +879,35 @@ def warranty_extraction(file_path, model, year):
     file_path (str): The path to the PDF file.
     model (str): The model name.
     year (int): The year of the data.
+    document (ParsedDocument, optional): The already parsed PDF. Parsed from file_path if not provided.
+    profile (Profile, optional): The document type profile. Defaults to the "spec" profile.
 
     Returns:
-    list: Extracted warranty data.
+    list: Extracted warranty data, empty if the document has no warranty section.
     """
-    page_text = read(file_path)
-    cropped_text = crop_pdf2(page_text, "Extended Warranty", 5)
-    
-    if cropped_text is None:
-        print(page_text)
+    if document is None:
+        document = parse_document(file_path)
+    if profile is None:
+        profile = get_registry().get("spec")
+    with Metrics.stage("warranty"):
+        heading = profile.get("warranty_heading")
+        cropped_text = crop_pages2(document, heading, profile.get("warranty_lines"))
+
+        if cropped_text is None:
+            Metrics.count("warnings")
+            print(f"Warning: No {heading} section found in {os.path.basename(file_path)}")
+            return []
 
-    lines = cropped_text.split('\n')
-    processed_lines = ["Extended Warranty " + line.strip() for line in lines]
-    final_text = '\n'.join(processed_lines)
+        lines = cropped_text.split('\n')
+        processed_lines = [heading + " " + line.strip() for line in lines]
+        final_text = '\n'.join(processed_lines)
 
-    headings = ["Extended Warranty"]
-    final_array = extract(final_text, headings, model, year, file_path)
+        final_array = extract(final_text, {heading}, model, year, file_path)
 
     return final_array
 
 
-def weights_summary(file_path, model, year):
+def weights_summary(file_path, model, year, document=None, profile=None, excel=True):
     """
     Extracts weight summary data from a PDF file and generates an Excel sheet.
 
@@ -435,61 +915,140 @@ def weights_summary(file_path, model, year):
     file_path (str): The path to the PDF file.
     model (str): The model name.
     year (int): The year of the data.
+    document (ParsedDocument, optional): The already parsed PDF. Parsed from file_path if not provided.
+    profile (Profile, optional): The document type profile. Defaults to the "spec" profile.
+
+    excel (bool, optional): Write WeightSummary.xlsx. Defaults to True.
 
     Returns:
-    None
+    list: Extracted weight summary rows, or 0 if the summary section is not found.
     """
-    original_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs')
-    page_text = read(file_path)
-
-    headings = ["Factory Weight", "Dealer Installed Options", "Total Weight"]
-    cropped_text = crop_pdf(page_text, "T O T A L  V E H I C L E  S U M M A R Y", "I T E M S  N O T  I N C L U D E D  I N  A D J U S T E D  L I S T")
-
-    if cropped_text is None:
-        cropped_text = crop_pdf(page_text, "T O T A L  V E H I C L E  S U M M A R Y", "Extended Warranty")
-        if cropped_text is None:
+    if document is None:
+        document = parse_document(file_path)
+    if profile is None:
+        profile = get_registry().get("spec")
+
+    with Metrics.stage("weights"):
+        start_keyword, end_keywords = profile.get("weights_crop")
+        for end_keyword in end_keywords:
+            cropped_text = crop_pages(document, start_keyword, end_keyword)
+            if cropped_text is not None:
+                break
+        else:
             print(file_path)
             return 0
 
-    cleaned_text = cleaning2(cropped_text, "Rear Total", "Adjusted List Price", "")
-    pattern = re.compile(r'\b(\d+)\s+lbs\b')
-    extracted_data = []
+        separator, fallback_separator = profile.get("weights_separators")
+        cleaned_text = cleaning2(cropped_text, separator, profile.get("weights_page_header"), fallback_separator)
+        pattern = re.compile(r'\b(\d+)\s+lbs\b')
+        extracted_data = []
 
-    for line in cleaned_text.splitlines():
-        line = line.strip()
-        heading = None
+        for line in cleaned_text.splitlines():
+            line = line.strip()
+            match = profile.weight_heading_pattern.match(line)
+            if match is None:
+                continue
+            heading = match.group()
+            rest_of_line = line[match.end():].strip()
 
-        for h in headings:
-            if line.startswith(h):
-                heading = h
-                rest_of_line = line[len(h):].strip()
-                break
+            matches = pattern.findall(rest_of_line)
+            if len(matches) != 3:
+                continue
 
-        if heading is None:
-            continue
+            try:
+                number1 = int(matches[0])
+                number2 = int(matches[1])
+                number3 = int(matches[2])
+            except ValueError:
+                continue
 
-        matches = pattern.findall(rest_of_line)
-        if len(matches) != 3:
-            continue
+            extracted_data.append([heading, number1, number2, number3, year, model])
 
-        try:
-            number1 = int(matches[0])
-            number2 = int(matches[1])
-            number3 = int(matches[2])
-        except ValueError:
-            continue
+    if excel:
+        import pandas as pd
+        final_csv = pd.DataFrame(extracted_data)
+        final_csv.columns = ["Headings","Weight Front", "Weight Rear", "Total Weight","Year", "Model"]
+
+        write_excel(final_csv, year, model, 'WeightSummary.xlsx')
+    return extracted_data
 
-        extracted_data.append([heading, number1, number2, number3, year, model])
 
-    final_csv = pd.DataFrame(extracted_data)
-    final_csv.columns = ["Headings","Weight Front", "Weight Rear", "Total Weight","Year", "Model"]
+def write_excel(final_csv, year, model, file_name):
+    """
+    Writes a DataFrame to outputs/<year>/<model>/<file_name>.
+    The sheet is first written to a uniquely named temporary file in the destination directory and then
+    renamed into place, so workers processing files concurrently never share a file name.
 
-    with pd.ExcelWriter('WeightSummary.xlsx') as writer:
-        final_csv.to_excel(writer, index=False)
+    Parameters:
+    final_csv (DataFrame): The data to write.
+    year (str): The year of the data.
+    model (str): The model name.
+    file_name (str): The name of the Excel file, e.g. 'Spec.xlsx'.
 
-    destination_dir = os.path.join(original_path, year, model)
+    Returns:
+    str: The path of the written file.
+    """
+    import pandas as pd
+    destination_dir = os.path.join(get_output_directory(), year, model)
     os.makedirs(destination_dir, exist_ok=True)
-    shutil.move('WeightSummary.xlsx', os.path.join(destination_dir, 'WeightSummary.xlsx'))
+    destination = os.path.join(destination_dir, file_name)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{file_name}.", suffix=".xlsx", dir=destination_dir)
+    os.close(fd)
+    try:
+        with Metrics.stage("write"):
+            with pd.ExcelWriter(temp_path) as writer:
+                final_csv.to_excel(writer, index=False)
+            os.replace(temp_path, destination)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return destination
+
+
+def write_tables(tables, year, model):
+    """
+    Writes the per-work-order Excel files of extracted tables the way spec_method() and quote_method() do.
+
+    Parameters:
+    tables (dict): The extracted rows keyed by table name, as returned by start().
+    year (str): The year of the data.
+    model (str): The model name.
+
+    Returns:
+    None
+    """
+    sheets = {
+        "Spec": tables.get("Spec", []) + tables.get("Warranty", []),
+        "Quote": tables.get("Quote", []),
+        "WeightSummary": tables.get("WeightSummary", []),
+    }
+    import pandas as pd
+    for name, rows in sheets.items():
+        if name in tables and rows:
+            final_csv = pd.DataFrame(rows)
+            final_csv.columns = SHEETS[name]
+            write_excel(final_csv, year, model, f'{name}.xlsx')
+
+
+def get_output_directory(output_dir=None):
+    """
+    Returns the output directory path. If output_dir is not specified, it defaults to the
+    EXTRACTION_OUTPUT_DIR environment variable, or the 'outputs' folder in the script's current directory.
+
+    Parameters:
+    output_dir (str): Optional path to the output directory. Defaults to None.
+
+    Returns:
+    str: The resolved output directory path.
+    """
+    if output_dir is None:
+        output_dir = os.environ.get("EXTRACTION_OUTPUT_DIR")
+    if output_dir is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        output_dir = os.path.join(script_dir, 'outputs')
+
+    return output_dir
+
 
 def get_input_directory(input_dir=None):
     """
@@ -508,25 +1067,355 @@ def get_input_directory(input_dir=None):
 
     return input_dir
 
-    
-input_dir = get_input_directory() 
-if not os.path.exists(input_dir):
-    print(f"Error: The input directory '{input_dir}' does not exist.")
-else:
+
+def iter_input_files(input_dir):
+    """
+    Walks input_dir/<year>/<model>/ and yields every PDF file found.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+
+    Returns:
+    generator: Tuples of (year, model, file_path).
+    """
     for name in os.listdir(input_dir):
         path = os.path.join(input_dir, name)
-        
-        if os.path.isdir(path):  
+
+        if os.path.isdir(path):
             year = name
-            
+
             for sub_name in os.listdir(path):
                 sub_path = os.path.join(path, sub_name)
-                
-                if os.path.isdir(sub_path):  
-                    model = sub_name 
-                    
+
+                if os.path.isdir(sub_path):
+                    model = sub_name
+
                     for file in os.listdir(sub_path):
                         file_path = os.path.join(sub_path, file)
-                        
+
                         if os.path.isfile(file_path) and file_path.lower().endswith('.pdf'):
-                            start(model, year, file_path) 
\ No newline at end of file
+                            yield year, model, file_path
+
+
+def process_file(model, year, file_path, ocr=False, excel=True, classify_pages=None, reuse=False, fingerprint=False):
+    """
+    Runs start() on a single file, turning an exception into an error entry so one bad file does not
+    stop the rest of the batch. The stage timings and counters of the file are added as "metrics".
+
+    Parameters:
+    model (str): The model of the item.
+    year (str): The year associated with the file.
+    file_path (str): The path to the PDF file.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    excel (bool, optional): Write the per-work-order Excel files. Defaults to True.
+    classify_pages (int, optional): The number of leading pages searched for the type markers. Defaults to None.
+    reuse (bool, optional): Reuse the tables of documents with the same body, see start(). Defaults to False.
+    fingerprint (bool, optional): Fingerprint the pages already extracted, see start(). Defaults to False.
+
+    Returns:
+    dict: The result of start(), or a result with an "error" message if processing failed.
+    """
+    Metrics.begin_file(file_path, year, model)
+    try:
+        result = start(model, year, file_path, ocr, excel, classify_pages, reuse, fingerprint)
+    except Exception as e:
+        Metrics.count("failures")
+        print(f"Error processing file {os.path.basename(file_path)}: {e}")
+        error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        result = {"file_path": file_path, "year": year, "model": model, "type": None, "tables": {}, "error": error}
+    result["metrics"] = Metrics.end_file()
+    result["metrics"]["type"] = result["type"]
+    if "error" in result:
+        result["metrics"]["error"] = result["error"]
+    return result
+
+
+def result_outputs(result):
+    """
+    Lists the Excel files written for a processed file.
+
+    Parameters:
+    result (dict): A result as returned by start().
+
+    Returns:
+    list of str: The paths of the output files that exist for this result.
+    """
+    destination_dir = os.path.join(get_output_directory(), result["year"], result["model"])
+    outputs = [os.path.join(destination_dir, f"{name}.xlsx") for name in result["tables"]]
+    return [output for output in outputs if os.path.exists(output)]
+
+
+def run_batch(input_dir, workers=None, manifest=None, force=False, metrics_log=None, ocr=False, store=None,
+              excel=True, rollup=None, classify_pages=None, duplicates=None, reuse=False):
+    """
+    Processes every PDF under input_dir/<year>/<model>/, fanning the files out across a pool of worker
+    processes and collecting the results in the parent process.
+    When a manifest is given, files that are unchanged since they were last extracted by the current
+    extractor_version() are skipped, and every successfully processed file is recorded in it.
+    When a store or rollup writer is given, the extracted rows of every file are written to it as they
+    are collected.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+    workers (int, optional): Number of worker processes. Defaults to the number of CPUs; 1 runs serially.
+    manifest (Manifest, optional): The manifest of previously processed files. Defaults to None.
+    force (bool, optional): Reprocess every file even if the manifest lists it as current. Defaults to False.
+    metrics_log (MetricsLog, optional): Where the metrics of every processed file are written. Defaults to None.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    store (SqliteStore, optional): The consolidated result store. Defaults to None.
+    excel (bool, optional): Write the per-work-order Excel files. Defaults to True.
+    rollup (RollupWriter, optional): The per-year rollup workbooks. Defaults to None.
+    classify_pages (int, optional): The number of leading pages searched for the type markers. Defaults to None.
+    duplicates (DuplicateIndex, optional): Collects the fingerprints to report duplicate documents. Defaults to None.
+    reuse (bool, optional): Reuse the tables of documents with the same body, see start(). Ignored with force,
+    so a forced run always extracts with the current code. Defaults to False.
+
+    Returns:
+    list of dict: One result per processed file, as returned by process_file().
+    """
+    reuse = reuse and not force
+    fingerprint = duplicates is not None
+    files = list(iter_input_files(input_dir))
+    if manifest is not None and not force:
+        version = extractor_version()
+        files = [(year, model, file_path) for year, model, file_path in files
+                 if not manifest.is_current(file_path, version)]
+
+    results = []
+
+    def collect(result):
+        results.append(result)
+        if store is not None:
+            store.write(result)
+        if rollup is not None:
+            rollup.write(result)
+        if duplicates is not None:
+            duplicates.add(result)
+        record_result(manifest, result, store)
+        if metrics_log is not None:
+            metrics_log.write(result["metrics"])
+
+    try:
+        if workers == 1:
+            for year, model, file_path in files:
+                collect(process_file(model, year, file_path, ocr, excel, classify_pages, reuse, fingerprint))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(process_file, model, year, file_path, ocr, excel, classify_pages, reuse,
+                                           fingerprint)
+                           for year, model, file_path in files]
+                for future in as_completed(futures):
+                    collect(future.result())
+    finally:
+        if store is not None:
+            store.flush()
+        if manifest is not None:
+            manifest.save()
+    return results
+
+
+def record_result(manifest, result, store=None):
+    """
+    Records a successfully processed file in the manifest. Failed files are left out so they are retried.
+
+    Parameters:
+    manifest (Manifest): The manifest to update, or None.
+    result (dict): A result as returned by process_file().
+    store (SqliteStore, optional): The result store the rows were written to, so deleting the store or the
+    file's rows makes the file due again. Defaults to None.
+
+    Returns:
+    None
+    """
+    if manifest is None or "error" in result:
+        return
+    manifest.record(result["file_path"], extractor_version(), result_outputs(result),
+                    store.path if store is not None else None)
+
+
+def iter_records(result):
+    """
+    Turns the extracted tables of a file into records.
+
+    Parameters:
+    result (dict): A result as returned by start().
+
+    Returns:
+    generator: One dict per extracted row: its "table" name and the values keyed by the RECORD_COLUMNS
+    of that table.
+    """
+    for name, rows in result["tables"].items():
+        columns = RECORD_COLUMNS[name]
+        for row in rows:
+            record = {"table": name}
+            record.update(zip(columns, row))
+            yield record
+
+
+def extract_document(file_path, year=None, model=None, ocr=False, excel=False, classify_pages=CLASSIFY_PAGES):
+    """
+    Extracts the records of a single PDF. This is the entry point for callers importing the extractor:
+    nothing is written unless excel is set, and pandas and openpyxl are only loaded for the Excel files.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    year (str, optional): The year of the work order. Defaults to the name of the folder above the file's folder,
+    as in inputs/<year>/<model>/.
+    model (str, optional): The model of the work order. Defaults to the name of the file's folder.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    excel (bool, optional): Also write the per-work-order Excel files. Defaults to False.
+    classify_pages (int, optional): The number of leading pages searched for the type markers; None searches
+    every page. Defaults to CLASSIFY_PAGES.
+
+    Returns:
+    list of dict: The extracted records, see iter_records(); empty if the document type is unknown.
+
+    Raises:
+    ExtractionError: If the file is missing or cannot be read as a PDF.
+    """
+    folder = os.path.dirname(os.path.abspath(file_path))
+    if model is None:
+        model = os.path.basename(folder)
+    if year is None:
+        year = os.path.basename(os.path.dirname(folder))
+    result = start(model, year, file_path, ocr, excel, classify_pages, reuse=False)
+    if "error" in result:
+        raise ExtractionError(f"Unable to open {file_path}: {result['error']}")
+    return list(iter_records(result))
+
+
+def iter_pdf_paths(paths):
+    """
+    Expands files and directories given on the command line into PDF files.
+
+    Parameters:
+    paths (list of str): Paths of PDF files or of directories searched recursively for PDF files.
+
+    Returns:
+    generator: The file paths, directories in sorted order.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for folder, sub_folders, files in os.walk(path):
+            sub_folders.sort()
+            for file in sorted(files):
+                if file.lower().endswith('.pdf'):
+                    yield os.path.join(folder, file)
+
+
+def stream_records(paths, output, output_format="jsonl", year=None, model=None, ocr=False, excel=False,
+                   classify_pages=CLASSIFY_PAGES):
+    """
+    Extracts PDF files one by one and writes their records to a stream as they are extracted.
+    Progress messages and warnings go to stderr so the stream only holds records.
+
+    Parameters:
+    paths (list of str): PDF files, or directories searched recursively for PDF files.
+    output (file): The text stream the records are written to, e.g. sys.stdout.
+    output_format (str, optional): "jsonl" for one JSON object per line, or "csv" with one header row
+    holding the columns of every table. Defaults to "jsonl".
+    year (str, optional): The year of every file, see extract_document(). Defaults to None.
+    model (str, optional): The model of every file, see extract_document(). Defaults to None.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    excel (bool, optional): Also write the per-work-order Excel files. Defaults to False.
+    classify_pages (int, optional): The number of leading pages searched for the type markers. Defaults to
+    CLASSIFY_PAGES.
+
+    Returns:
+    int: The number of files that could not be processed.
+    """
+    writer = None
+    if output_format == "csv":
+        columns = ["table"]
+        for table_columns in RECORD_COLUMNS.values():
+            columns += [column for column in table_columns if column not in columns]
+        writer = csv.DictWriter(output, fieldnames=columns)
+        writer.writeheader()
+    failures = 0
+    for file_path in iter_pdf_paths(paths):
+        try:
+            with redirect_stdout(sys.stderr):
+                records = extract_document(file_path, year, model, ocr, excel, classify_pages)
+        except Exception as e:
+            failures += 1
+            print(f"Error processing file {os.path.basename(file_path)}: {e}", file=sys.stderr)
+            continue
+        for record in records:
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                output.write(json.dumps(record) + '\n')
+        output.flush()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract spec and quote data from inputs/<year>/<model>/*.pdf, or stream the records of the "
+                    "given files to stdout."
+    )
+    parser.add_argument("paths", nargs="*",
+                        help="PDF files or directories to extract; their records are written to stdout instead of "
+                             "running the batch over the input directory.")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl",
+                        help="Record format when paths are given. Defaults to jsonl.")
+    parser.add_argument("--year", default=None,
+                        help="Year of the given files. Defaults to the name of the folder above each file's folder.")
+    parser.add_argument("--model", default=None, help="Model of the given files. Defaults to each file's folder name.")
+    parser.add_argument("--input-dir", default=None, help="Input directory. Defaults to 'inputs' next to this script.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes. Defaults to the number of CPUs; 1 runs serially.")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess every file, even those the manifest lists as unchanged.")
+    parser.add_argument("--metrics", default=None,
+                        help="JSON lines file for per-file metrics. Defaults to 'metrics.jsonl' in the output directory.")
+    parser.add_argument("--ocr", action="store_true",
+                        help="OCR the pages without extractable text (needs PyMuPDF and Tesseract).")
+    parser.add_argument("--store", default=None,
+                        help="SQLite result store. Defaults to 'results.sqlite' in the output directory; 'none' disables it.")
+    parser.add_argument("--excel", action="store_true",
+                        help="Also write the per-work-order Spec, Quote and WeightSummary Excel files.")
+    parser.add_argument("--rollup", action="store_true",
+                        help="Write one Rollup.xlsx per year covering every model. Implies --force so no work order is left out.")
+    parser.add_argument("--classify-pages", type=int, default=CLASSIFY_PAGES,
+                        help=f"Leading pages searched for the document type markers; 0 searches every page. Defaults to {CLASSIFY_PAGES}.")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse the rows of documents whose body was already extracted by the same rules and code "
+                             "(kept in cache/tables). Extracts every page to fingerprint it. Ignored with --force.")
+    args = parser.parse_args()
+
+    input_dir = get_input_directory(args.input_dir)
+    if args.paths:
+        try:
+            failures = stream_records(args.paths, sys.stdout, args.format, args.year, args.model, args.ocr,
+                                      args.excel, args.classify_pages)
+        except BrokenPipeError:
+            # The reader closed the pipe early (e.g. head); stop quietly.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            failures = 0
+        sys.exit(1 if failures else 0)
+    elif not os.path.exists(input_dir):
+        print(f"Error: The input directory '{input_dir}' does not exist.")
+    else:
+        manifest = Manifest(os.path.join(get_output_directory(), 'manifest.json'), input_dir)
+        metrics_log = Metrics.MetricsLog(args.metrics or os.path.join(get_output_directory(), 'metrics.jsonl'))
+        store = None
+        if (args.store or '').lower() != 'none':
+            store = SqliteStore(args.store or os.path.join(get_output_directory(), 'results.sqlite'))
+        rollup = RollupWriter(get_output_directory()) if args.rollup else None
+        from Fingerprint import DuplicateIndex
+        duplicates = DuplicateIndex()
+        try:
+            run_batch(input_dir, args.workers, manifest, args.force or args.rollup, metrics_log, args.ocr, store,
+                      args.excel, rollup, args.classify_pages, duplicates, args.reuse)
+            clusters = duplicates.write_report(os.path.join(get_output_directory(), 'duplicates.json'))
+            print(f"Found {len(clusters)} groups of duplicate documents")
+        finally:
+            if rollup is not None:
+                for path in rollup.close():
+                    print(f"Rollup written to {path}")
+            if store is not None:
+                store.close()
+            metrics_log.close()
@@ -0,0 +1,360 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+from DiskCache import DiskCache
+
+SHINGLE_SIZE = 5
+NUM_HASHES = 64
+BANDS = 16
+SIMILARITY_THRESHOLD = 0.9
+
+REUSE_CACHE_DIR = os.environ.get(
+    "REUSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'tables')
+)
+REUSE_MAX_BYTES = 256 * 1024 * 1024
+# Seconds a process waits for another process extracting the same document before extracting it itself.
+CLAIM_TIMEOUT = 120.0
+
+# Every page of a spec pack starts with a "Prepared for:" block naming the customer, the work order and
+# the print date, closed by the page number. Only that block differs between reissues of the same proposal.
+PAGE_HEADER_END = re.compile(r'^\s*Page \d+ of \d+\s*$', re.MULTILINE)
+DATE_TIME = re.compile(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b|\b\d{1,2}:\d{2}\s*[AP]M\b', re.IGNORECASE)
+
+_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20180918)
+_A = _random.randint(1, _PRIME, NUM_HASHES).astype(np.uint64)
+_B = _random.randint(0, _PRIME, NUM_HASHES).astype(np.uint64)
+
+_reuse_cache = None
+
+
+def page_body(text):
+    """
+    Removes the page header block from the text of a page.
+
+    Parameters:
+    text (str): The text of the page.
+
+    Returns:
+    str: The text after the "Page N of M" line, or the whole text if the page has no header block.
+    """
+    match = PAGE_HEADER_END.search(text)
+    return text[match.end():] if match else text
+
+
+def minhash(words):
+    """
+    Computes the MinHash signature of the word shingles of a text.
+
+    Parameters:
+    words (list of str): The words of the text.
+
+    Returns:
+    numpy.ndarray: NUM_HASHES minimum hash values; equal positions estimate the Jaccard similarity.
+    """
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+    values = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') & _PRIME
+         for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    return ((np.outer(values, _A) + _B) % _PRIME).min(axis=0)
+
+
+def fingerprint(pages):
+    """
+    Fingerprints a document by its body text, ignoring the page header blocks.
+
+    Parameters:
+    pages (list of str): The text of every page.
+
+    Returns:
+    tuple: The SHA-256 of the page bodies, identical for documents that extract to the same rows, and the
+    MinHash signature of the body words with dates and times masked, for finding near-duplicates.
+    """
+    bodies = [page_body(text) for text in pages]
+    digest = hashlib.sha256('\f'.join(bodies).encode('utf-8')).hexdigest()
+    words = DATE_TIME.sub(' ', ' '.join(bodies)).lower().split()
+    return digest, minhash(words)
+
+
+def retag(tables, year, model, file_path):
+    """
+    Copies the extracted tables of one work order to another by replacing the year, model and file path
+    columns at the end of each row.
+
+    Parameters:
+    tables (dict): The extracted rows keyed by table name, as returned by start().
+    year (str): The year of the work order.
+    model (str): The model of the work order.
+    file_path (str): The path to the PDF file.
+
+    Returns:
+    dict: The re-tagged rows keyed by table name.
+    """
+    tags = {"Spec": 6, "Warranty": 6, "Quote": 4, "WeightSummary": 4}
+    retagged = {}
+    for name, rows in tables.items():
+        start = tags[name]
+        retagged[name] = [list(row[:start]) + [year, model, file_path][:len(row) - start] for row in rows]
+    return retagged
+
+
+class ReuseCache(DiskCache):
+    """
+    Persistent cache of the extracted tables of each document, keyed by profile, body fingerprint and the
+    version of the rules and rule code (see Extraction.rules_version()), so a reissued proposal is re-tagged
+    instead of extracted again by any process that shares the cache: pool workers, supervised workers and
+    later runs alike. Entries are gzip-compressed JSON, evicted least recently used first (see DiskCache).
+    A process about to extract a document claims it first, so others processing a duplicate at the same
+    time wait for its tables.
+
+    Attributes:
+    directory (str): The cache directory.
+    max_bytes (int): The size the cache is trimmed back to.
+    """
+
+    suffix = '.json.gz'
+
+    def __init__(self, directory=REUSE_CACHE_DIR, max_bytes=REUSE_MAX_BYTES):
+        super().__init__(directory, max_bytes)
+        self._claimed = set()
+
+    @staticmethod
+    def key(profile_name, digest, extractor_version):
+        """
+        Computes the cache key of a document.
+
+        Parameters:
+        profile_name (str): The name of the document's profile, e.g. "spec".
+        digest (str): The body digest, see fingerprint().
+        extractor_version (str): The version of the extraction rules and code, see Extraction.rules_version().
+
+        Returns:
+        str: The hexadecimal SHA-256 of the three.
+        """
+        return hashlib.sha256(f"{profile_name}\0{digest}\0{extractor_version}".encode('utf-8')).hexdigest()
+
+    def encode(self, value):
+        """
+        Compresses a cache entry.
+
+        Parameters:
+        value (dict): The extracted tables.
+
+        Returns:
+        bytes: The gzip-compressed JSON.
+        """
+        return gzip.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'), compresslevel=6)
+
+    def decode(self, data):
+        """
+        Decompresses a cache entry.
+
+        Parameters:
+        data (bytes): The stored bytes.
+
+        Returns:
+        dict: The extracted tables.
+        """
+        return json.loads(gzip.decompress(data).decode('utf-8'))
+
+    def claim(self, key, timeout=CLAIM_TIMEOUT):
+        """
+        Looks up the tables of a document, waiting while another process extracts the same document.
+        If they are not available, the document is claimed for this process, which must put() its tables
+        or release() the claim.
+
+        Parameters:
+        key (str): The cache key.
+        timeout (float, optional): Seconds to wait for another process, after which its claim is ignored.
+        Defaults to CLAIM_TIMEOUT.
+
+        Returns:
+        dict: The extracted tables, or None if this process should extract the document.
+        """
+        marker = self._path(key) + '.claim'
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        deadline = time.monotonic() + timeout
+        while True:
+            tables = self.get(key)
+            if tables is not None:
+                return tables
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                try:
+                    stale = time.time() - os.stat(marker).st_mtime > timeout
+                except FileNotFoundError:
+                    continue
+                if stale:
+                    # Left behind by a process that died while extracting.
+                    try:
+                        os.remove(marker)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                if time.monotonic() > deadline:
+                    return None
+                time.sleep(0.05)
+                continue
+            self._claimed.add(key)
+            # The other process may have stored the tables between the lookup and the claim.
+            tables = self.get(key)
+            if tables is not None:
+                self.release(key)
+            return tables
+
+    def put(self, key, tables):
+        """
+        Stores the tables of a document and releases its claim.
+
+        Parameters:
+        key (str): The cache key.
+        tables (dict): The extracted tables.
+
+        Returns:
+        None
+        """
+        super().put(key, tables)
+        self.release(key)
+
+    def release(self, key):
+        """
+        Releases the claim this process holds on a document, if any.
+
+        Parameters:
+        key (str): The cache key.
+
+        Returns:
+        None
+        """
+        if key not in self._claimed:
+            return
+        self._claimed.discard(key)
+        try:
+            os.remove(self._path(key) + '.claim')
+        except FileNotFoundError:
+            pass
+
+
+def get_reuse_cache():
+    """
+    Returns the reuse cache of this process, opening it on first use.
+
+    Returns:
+    ReuseCache: The cache in REUSE_CACHE_DIR.
+    """
+    global _reuse_cache
+    if _reuse_cache is None:
+        _reuse_cache = ReuseCache()
+    return _reuse_cache
+
+
+class DuplicateIndex:
+    """
+    Groups the processed documents into clusters of identical and near-identical documents, using
+    locality-sensitive hashing over the MinHash signatures to find candidate pairs.
+
+    Attributes:
+    threshold (float): The estimated Jaccard similarity above which two documents are near-duplicates.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._files = []
+        self._digests = []
+        self._signatures = []
+        self._buckets = {}
+        self._parent = []
+
+    def _find(self, i):
+        while self._parent[i] != i:
+            self._parent[i] = self._parent[self._parent[i]]
+            i = self._parent[i]
+        return i
+
+    def add(self, result):
+        """
+        Adds a processed file.
+
+        Parameters:
+        result (dict): A result as returned by start(); files without a "fingerprint" are ignored.
+
+        Returns:
+        None
+        """
+        if not result.get("fingerprint"):
+            return
+        digest, signature = result["fingerprint"]
+        signature = np.asarray(signature, dtype=np.uint64)
+        index = len(self._files)
+        self._files.append(result["file_path"])
+        self._digests.append(digest)
+        self._signatures.append(signature)
+        self._parent.append(index)
+        rows = NUM_HASHES // BANDS
+        candidates = set()
+        for band in range(BANDS):
+            bucket = self._buckets.setdefault((band, signature[band * rows:(band + 1) * rows].tobytes()), [])
+            candidates.update(bucket)
+            bucket.append(index)
+        for other in candidates:
+            if self.similarity(index, other) >= self.threshold:
+                self._parent[self._find(index)] = self._find(other)
+
+    def similarity(self, i, j):
+        """
+        Estimates the similarity of two added documents.
+
+        Parameters:
+        i (int): The index of the first document.
+        j (int): The index of the second document.
+
+        Returns:
+        float: 1.0 for identical bodies, otherwise the fraction of equal MinHash values.
+        """
+        if self._digests[i] == self._digests[j]:
+            return 1.0
+        return float(np.mean(self._signatures[i] == self._signatures[j]))
+
+    def clusters(self):
+        """
+        Lists the groups of duplicate documents.
+
+        Returns:
+        list of dict: For every group of two or more files, its "files", whether they are all "identical"
+        and the lowest "similarity" to the first file.
+        """
+        groups = {}
+        for index in range(len(self._files)):
+            groups.setdefault(self._find(index), []).append(index)
+        clusters = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            clusters.append({
+                "files": [self._files[i] for i in members],
+                "identical": len({self._digests[i] for i in members}) == 1,
+                "similarity": min(self.similarity(members[0], i) for i in members[1:]),
+            })
+        return clusters
+
+    def write_report(self, path):
+        """
+        Writes the duplicate clusters as JSON.
+
+        Parameters:
+        path (str): The path of the report.
+
+        Returns:
+        list of dict: The clusters, as returned by clusters().
+        """
+        clusters = self.clusters()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"clusters": clusters}, f, indent=1)
+        return clusters
@@ -0,0 +1,188 @@
+import re
+import fitz  # PyMuPDF
+
+# Words whose baselines are closer than this many points belong to the same row.
+ROW_TOLERANCE = 3.0
+# A word belongs to a column if its aligned edge is this close to the edge of the column's header label.
+COLUMN_TOLERANCE = 10.0
+# Header labels on baselines further than this from the description label are not part of the header.
+HEADER_DISTANCE = 12.0
+
+DATA_CODE = re.compile(r'^[A-Za-z0-9]{3}-[A-Za-z0-9]{3}$')
+# Credits are printed as ($4.00) and weight reductions as -50.
+NUMBER = re.compile(r'^(-?)(\(?)\$?((\d{1,3}(,\d{3})+|\d+)(\.\d+)?)\)?$')
+NUMERIC_COLUMNS = ("front", "rear", "price")
+
+
+def page_rows(page):
+    """
+    Groups the words of a page into rows by their baseline.
+
+    Parameters:
+    page (fitz.Page): The page.
+
+    Returns:
+    list of tuple: The rows from top to bottom, each a (baseline, words) tuple where words is a list of
+    (x0, x1, text) tuples from left to right.
+    """
+    rows = []
+    for x0, _, x1, y1, text, *_ in sorted(page.get_text("words"), key=lambda word: (word[3], word[0])):
+        if not rows or y1 - rows[-1][0] > ROW_TOLERANCE:
+            rows.append((y1, []))
+        rows[-1][1].append((x0, x1, text))
+    for _, words in rows:
+        words.sort()
+    return rows
+
+
+def find_label(words, label):
+    """
+    Finds a header label in the words of a row.
+
+    Parameters:
+    words (list of tuple): The (x0, x1, text) words of the row.
+    label (str): The label, e.g. "Retail Price".
+
+    Returns:
+    tuple: The left edge of its first word and the right edge of its last word, or None if the row does
+    not contain the label.
+    """
+    parts = label.split()
+    texts = [text for _, _, text in words]
+    for i in range(len(texts) - len(parts) + 1):
+        if texts[i:i + len(parts)] == parts:
+            return words[i][0], words[i + len(parts) - 1][1]
+    return None
+
+
+def find_columns(rows, labels):
+    """
+    Locates the column header of a table page.
+
+    Parameters:
+    rows (list of tuple): The rows of the page, as returned by page_rows().
+    labels (dict): The header label of the "code", "description", "front", "rear" and "price" columns.
+    The numeric columns may be missing, e.g. proposals without prices have no "Retail Price" column.
+
+    Returns:
+    tuple: The index of the last header row and the column edges: the left edge of the "code" and
+    "description" labels and the right edge of the numeric ones, the way their values are aligned.
+    None if the page has no column header.
+    """
+    for index, (baseline, words) in enumerate(rows):
+        description = find_label(words, labels["description"])
+        if description is None:
+            continue
+        header = [i for i, (other, _) in enumerate(rows) if abs(other - baseline) <= HEADER_DISTANCE]
+        columns = {"description": description[0]}
+        for name in ("code",) + NUMERIC_COLUMNS:
+            for i in header:
+                edges = find_label(rows[i][1], labels[name]) if labels.get(name) else None
+                if edges is not None:
+                    columns[name] = edges[0] if name == "code" else edges[1]
+                    break
+        if "code" in columns:
+            return max(header), columns
+    return None
+
+
+def to_number(text):
+    """
+    Parses a weight or price.
+
+    Parameters:
+    text (str): The value, e.g. "5,759", "-50", "$1,083.00" or "($4.00)".
+
+    Returns:
+    float: The value, negative for credits, or None if the text is not a number, e.g. "N/C" or "STD".
+    """
+    match = NUMBER.match(text)
+    if match is None or bool(match.group(2)) != text.endswith(')'):
+        return None
+    value = float(match.group(3).replace(',', ''))
+    return -value if match.group(1) or match.group(2) else value
+
+
+def numeric_column(columns, x1):
+    """
+    Finds the right-aligned column a word ending at x1 belongs to.
+
+    Parameters:
+    columns (dict): The column edges, as returned by find_columns().
+    x1 (float): The right edge of the word.
+
+    Returns:
+    str: "front", "rear" or "price", or None if the word is not in a numeric column.
+    """
+    distance, name = min((abs(columns[name] - x1), name) for name in NUMERIC_COLUMNS if name in columns)
+    return name if distance <= COLUMN_TOLERANCE else None
+
+
+def spec_rows(file_path, first, last, headings, labels, end_keyword, footer, model, year):
+    """
+    Extracts the line items of a specification proposal from the positions of its words instead of its
+    text: every word is assigned to the heading, data code, description, weight or price column by its
+    x-position, in a single pass over each page.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    first (int): The zero-based index of the page the proposal starts on.
+    last (int): The zero-based index of the page the proposal ends on.
+    headings (set of str): The section headings of the specification.
+    labels (dict): The column header labels, see find_columns().
+    end_keyword (str): The title ending the proposal, matched ignoring spaces, e.g. "T O T A L  V E H I C L E".
+    footer (str): The text the page footer starts with, e.g. "Application Version", or None.
+    model (str): The model of the item.
+    year (str): The year associated with the data.
+
+    Returns:
+    list: The extracted rows, each [heading, data code, description, weight front, weight rear, retail price,
+    year, model, file_path] like the rows of Extraction.extract().
+    """
+    end = end_keyword.replace(' ', '')
+    extracted_data = []
+    record = None
+    heading = None
+    document = fitz.open(file_path)
+    try:
+        for index in range(first, last + 1):
+            rows = page_rows(document[index])
+            header = find_columns(rows, labels)
+            if header is None:
+                continue
+            header_index, columns = header
+            for _, words in rows[header_index + 1:]:
+                text = ' '.join(word for _, _, word in words)
+                if text.replace(' ', '') == end:
+                    return extracted_data
+                if footer and text.startswith(footer):
+                    break
+                x0 = words[0][0]
+                if x0 < columns["code"] - COLUMN_TOLERANCE:
+                    # A section heading; lines below an unknown heading are skipped until the next known one.
+                    heading = text if text in headings else None
+                    record = None
+                    continue
+                if x0 < columns["description"] - COLUMN_TOLERANCE and DATA_CODE.match(words[0][2]):
+                    record = None
+                    if heading is not None:
+                        record = [heading, words[0][2], '', 0, 0, 0, year, model, file_path]
+                        extracted_data.append(record)
+                    words = words[1:]
+                if record is None:
+                    continue
+                description = []
+                for _, x1, word in words:
+                    name = numeric_column(columns, x1) if len(columns) > 2 else None
+                    value = to_number(word) if name else None
+                    if name == "price":
+                        record[5] = value or 0
+                    elif value is not None:
+                        record[3 if name == "front" else 4] = int(value)
+                    else:
+                        description.append(word)
+                if description:
+                    record[2] = ' '.join(filter(None, [record[2]] + description))
+    finally:
+        document.close()
+    return extracted_data
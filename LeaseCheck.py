@@ -0,0 +1,137 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+
+
+def run_check_node(input_dir, lease_dir, output_dir, node_id, workers, ttl):
+    """
+    Process entry point: runs one lease node over the shared input and lease directories, writing its
+    own result store like a node started by Leases.py.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+    lease_dir (str): The shared lease directory.
+    output_dir (str): Where the node writes results-<node_id>.sqlite.
+    node_id (str): The name of the node.
+    workers (int): Number of worker processes of the node.
+    ttl (float): Seconds after which an untouched lease is considered stale.
+
+    Returns:
+    None
+    """
+    import Extraction
+    from Leases import LeaseDirectory, run_node
+    from ResultStore import SqliteStore
+
+    leases = LeaseDirectory(lease_dir, input_dir, node_id, ttl)
+    store = SqliteStore(os.path.join(output_dir, f'results-{node_id}.sqlite'))
+    try:
+        run_node(input_dir, leases, workers, store=store, excel=False, classify_pages=Extraction.CLASSIFY_PAGES)
+    finally:
+        store.close()
+
+
+def check_leases(input_dir, work_dir, nodes=4, workers=1, ttl=600.0):
+    """
+    Starts several lease nodes at once on the same input directory, then checks that every file was
+    extracted by exactly one node, that no lease is left behind and that merging the node stores, twice,
+    gives no duplicate rows.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+    work_dir (str): An empty directory for the leases, the node stores and the caches.
+    nodes (int, optional): Number of node processes. Defaults to 4.
+    workers (int, optional): Number of worker processes of each node. Defaults to 1.
+    ttl (float, optional): Lease ttl of the nodes. Defaults to 600.
+
+    Returns:
+    list of str: The problems found, empty if the check passed.
+    """
+    # Set before the nodes import the extraction modules, so they use caches of their own.
+    os.environ["EXTRACTION_OUTPUT_DIR"] = work_dir
+    os.environ["TEXT_CACHE_DIR"] = os.path.join(work_dir, "text-cache")
+    os.environ["REUSE_CACHE_DIR"] = os.path.join(work_dir, "reuse-cache")
+    import Extraction
+    from Leases import LeaseDirectory
+    from ResultStore import TABLES, merge_stores
+
+    lease_dir = os.path.join(work_dir, "leases")
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_check_node,
+                        args=(input_dir, lease_dir, work_dir, f"node{index}", workers, ttl))
+        for index in range(nodes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    problems = [f"node{index} exited with code {process.exitcode}"
+                for index, process in enumerate(processes) if process.exitcode != 0]
+    leftovers = [path for pattern in ("*.lease", "*.stale")
+                 for path in glob.glob(os.path.join(lease_dir, "*", pattern))]
+    problems += [f"leftover lease {os.path.relpath(path, lease_dir)}" for path in leftovers]
+
+    files = [file_path for _, _, file_path in Extraction.iter_input_files(input_dir)]
+    leases = LeaseDirectory(lease_dir, input_dir, "check")
+    problems += [f"no done marker for {leases.key(file_path)}" for file_path in files
+                 if not os.path.exists(leases._file(file_path, '.done'))]
+
+    sources = sorted(glob.glob(os.path.join(work_dir, "results-*.sqlite")))
+    extracted = Counter()
+    for source in sources:
+        connection = sqlite3.connect(source)
+        try:
+            extracted.update(file_path for file_path, in connection.execute("SELECT file_path FROM files"))
+        finally:
+            connection.close()
+    problems += [f"{file_path} extracted by {count} nodes" for file_path, count in extracted.items() if count > 1]
+    problems += [f"{file_path} extracted by no node" for file_path in files if file_path not in extracted]
+
+    merged = os.path.join(work_dir, "results.sqlite")
+    for _ in range(2):
+        merge_stores(merged, sources)
+    connection = sqlite3.connect(merged)
+    try:
+        for table in TABLES:
+            duplicates = connection.execute(
+                f"SELECT file_path, row, COUNT(*) FROM {table} GROUP BY file_path, row HAVING COUNT(*) > 1"
+            ).fetchall()
+            problems += [f"{count} copies of {table} row {row} of {file_path}" for file_path, row, count in duplicates]
+        rows = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+    finally:
+        connection.close()
+    print(f"{len(files)} files, {len(sources)} node stores, merged rows: "
+          + ", ".join(f"{table} {count}" for table, count in rows.items()))
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run several lease nodes at once on one input directory and check that every file is "
+                    "extracted once, no lease is left behind and the merged store has no duplicate rows.")
+    parser.add_argument("--input-dir", default=None,
+                        help="Input directory of <year>/<model>/ folders. Defaults to a generated corpus.")
+    parser.add_argument("--nodes", type=int, default=4, help="Number of node processes. Defaults to 4.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes per node. Defaults to 1.")
+    parser.add_argument("--documents", type=int, default=24,
+                        help="Documents in the generated corpus. Defaults to 24.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_dir = args.input_dir
+        if input_dir is None:
+            from Benchmark import generate_corpus
+            generate_corpus(os.path.join(work_dir, "corpus"), args.documents, options=30)
+            input_dir = os.path.join(work_dir, "corpus", "inputs")
+        problems = check_leases(input_dir, os.path.join(work_dir, "run"), args.nodes, args.workers)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    print("FAIL" if problems else "OK")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,335 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import Extraction
+import Metrics
+from Manifest import Manifest
+from ResultStore import SqliteStore, merge_stores
+
+
+class LeaseDirectory(Manifest):
+    """
+    Coordinates several extractor nodes sharing one input directory, typically over NFS, without a
+    coordinator. A node claims a file by creating its lease file with O_CREAT | O_EXCL, which only one node
+    can do, and keeps the lease fresh by touching it. A lease not touched for ttl seconds belongs to a
+    dead node and is reclaimed. Finished files get a done marker holding the same entry a Manifest keeps,
+    so every node skips files that any node has already extracted.
+
+    Lease and done files live in <path>/<xx>/<sha1 of the relative input path>.lease / .done.
+    The ttl must be well above the clock skew between the nodes.
+
+    Attributes:
+    path (str): The lease directory on the shared filesystem.
+    root (str): The input directory the keys are relative to.
+    node_id (str): The name of this node, written into its leases.
+    ttl (float): Seconds after which an untouched lease is considered stale.
+    """
+
+    def __init__(self, path, root, node_id, ttl=600.0):
+        self.path = path
+        self.root = root
+        self.node_id = node_id
+        self.ttl = ttl
+        self.entries = {}
+        self._stores = {}
+        self._held = set()
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, file_path, suffix):
+        name = hashlib.sha1(self.key(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, name[:2], name + suffix)
+
+    def acquire(self, file_path):
+        """
+        Claims a file for this node.
+
+        Parameters:
+        file_path (str): The path to the input file.
+
+        Returns:
+        bool: True if this node now holds the lease, False if another node does.
+        """
+        path = self._file(file_path, '.lease')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._reclaim(path):
+                    return False
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"node": self.node_id, "file": self.key(file_path), "time": time.time()}, f)
+            with self._lock:
+                self._held.add(path)
+            return True
+        return False
+
+    def _reclaim(self, path):
+        try:
+            if time.time() - os.stat(path).st_mtime < self.ttl:
+                return False
+        except FileNotFoundError:
+            return True
+        # Rename the stale lease away first: only one node can win the rename.
+        stale = f"{path}.{self.node_id}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(stale).st_mtime < self.ttl:
+            # Another node reclaimed it and took a fresh lease in between; put that lease back.
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        print(f"Reclaimed stale lease {os.path.basename(path)}")
+        return True
+
+    def renew(self):
+        """
+        Touches every lease this node holds so other nodes do not reclaim them.
+
+        Returns:
+        None
+        """
+        with self._lock:
+            held = list(self._held)
+        for path in held:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                print(f"Warning: Lease {os.path.basename(path)} was reclaimed by another node")
+
+    def release(self, file_path):
+        """
+        Gives up the lease of a file.
+
+        Parameters:
+        file_path (str): The path to the input file.
+
+        Returns:
+        None
+        """
+        path = self._file(file_path, '.lease')
+        with self._lock:
+            self._held.discard(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def is_current(self, file_path, extractor_version):
+        """
+        Checks the done marker of a file, see Manifest.is_current().
+
+        Parameters:
+        file_path (str): The path to the input file.
+        extractor_version (str): The version of the extraction rules currently in use.
+
+        Returns:
+        bool: True if some node already extracted this version of the file.
+        """
+        try:
+            with open(self._file(file_path, '.done'), 'r', encoding='utf-8') as f:
+                self.entries[self.key(file_path)] = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return super().is_current(file_path, extractor_version)
+
+    def record(self, file_path, extractor_version, outputs, store=None):
+        """
+        Writes the done marker of a file, see Manifest.record().
+
+        Parameters:
+        file_path (str): The path to the input file.
+        extractor_version (str): The version of the extraction rules that produced the outputs.
+        outputs (list of str): The paths of the output files written for this input.
+        store (str, optional): The path of the result store the rows were written to. Defaults to None.
+
+        Returns:
+        None
+        """
+        super().record(file_path, extractor_version, outputs, store)
+        path = self._file(file_path, '.done')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".done.", suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.entries.pop(self.key(file_path)), f)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def save(self):
+        """
+        Does nothing: done markers are written as files finish.
+
+        Returns:
+        None
+        """
+
+
+def run_node(input_dir, leases, workers=None, force=False, metrics_log=None, store=None, ocr=False, excel=True,
+             classify_pages=None, reuse=False):
+    """
+    Processes the PDFs under input_dir/<year>/<model>/ that no other node has claimed or finished.
+    Any number of nodes can run this at the same time on the same shared input and lease directories;
+    each file is extracted once. Nodes start their walk at different offsets to avoid contending for
+    the same leases.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+    leases (LeaseDirectory): The shared lease directory.
+    workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+    force (bool, optional): Reprocess files that already have a done marker. Defaults to False.
+    metrics_log (MetricsLog, optional): Where the metrics of every processed file are written. Defaults to None.
+    store (SqliteStore, optional): This node's result store. Defaults to None.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    excel (bool, optional): Write the per-work-order Excel files. Defaults to True.
+    classify_pages (int, optional): The number of leading pages searched for the type markers. Defaults to None.
+    reuse (bool, optional): Reuse the tables of documents with the same body, see Extraction.start(). Ignored
+    with force. Defaults to False.
+
+    Returns:
+    list of dict: One result per file processed by this node, as returned by Extraction.process_file().
+    """
+    workers = workers or os.cpu_count() or 1
+    reuse = reuse and not force
+    files = sorted(Extraction.iter_input_files(input_dir))
+    if files:
+        offset = int(hashlib.sha1(leases.node_id.encode('utf-8')).hexdigest(), 16) % len(files)
+        files = files[offset:] + files[:offset]
+    pending = iter(files)
+    results = []
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(leases.ttl / 3):
+            leases.renew()
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    def claim():
+        for year, model, file_path in pending:
+            if not force and leases.is_current(file_path, Extraction.extractor_version()):
+                continue
+            if not leases.acquire(file_path):
+                continue
+            # Another node may have finished the file between the check and the claim.
+            if not force and leases.is_current(file_path, Extraction.extractor_version()):
+                leases.release(file_path)
+                continue
+            return year, model, file_path
+        return None
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            while True:
+                while len(in_flight) < workers:
+                    claimed = claim()
+                    if claimed is None:
+                        break
+                    year, model, file_path = claimed
+                    future = executor.submit(Extraction.process_file, model, year, file_path, ocr, excel,
+                                             classify_pages, reuse)
+                    in_flight[future] = file_path
+                if not in_flight:
+                    break
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                        results.append(result)
+                        if store is not None:
+                            # Committed before the done marker, which other nodes check the row against.
+                            store.write(result)
+                            store.flush()
+                        if metrics_log is not None:
+                            metrics_log.write(result["metrics"])
+                        Extraction.record_result(leases, result, store)
+                    finally:
+                        leases.release(file_path)
+    finally:
+        stop.set()
+        if store is not None:
+            store.flush()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract inputs/<year>/<model>/*.pdf together with other nodes sharing the same directories."
+    )
+    parser.add_argument("--input-dir", default=None, help="Input directory. Defaults to 'inputs' next to this script.")
+    parser.add_argument("--lease-dir", default=None,
+                        help="Shared lease directory. Defaults to 'leases' in the output directory.")
+    parser.add_argument("--node-id", default=None,
+                        help="Name of this node, the same on every run so reruns replace its earlier rows. "
+                             "Defaults to the hostname; give each node on a shared host its own name.")
+    parser.add_argument("--lease-ttl", type=float, default=600.0,
+                        help="Seconds after which the lease of a silent node is reclaimed.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--force", action="store_true", help="Reprocess files that were already extracted.")
+    parser.add_argument("--metrics", default=None,
+                        help="JSON lines file for per-file metrics. Defaults to 'metrics-<node>.jsonl' in the output directory.")
+    parser.add_argument("--ocr", action="store_true",
+                        help="OCR the pages without extractable text (needs PyMuPDF and Tesseract).")
+    parser.add_argument("--store", default=None,
+                        help="SQLite result store of this node. Defaults to 'results-<node>.sqlite' in the output "
+                             "directory; 'none' disables it.")
+    parser.add_argument("--merge", action="store_true",
+                        help="Instead of extracting, merge the result stores of every node (results-*.sqlite in the "
+                             "output directory) into the --store path, by default 'results.sqlite', keeping only "
+                             "the latest extraction of each file.")
+    parser.add_argument("--excel", action="store_true",
+                        help="Also write the per-work-order Spec, Quote and WeightSummary Excel files.")
+    parser.add_argument("--classify-pages", type=int, default=Extraction.CLASSIFY_PAGES,
+                        help=f"Leading pages searched for the document type markers; 0 searches every page. "
+                             f"Defaults to {Extraction.CLASSIFY_PAGES}.")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse the rows of documents whose body was already extracted by the same rules and code "
+                             "(kept in cache/tables). Extracts every page to fingerprint it. Ignored with --force.")
+    args = parser.parse_args()
+
+    input_dir = Extraction.get_input_directory(args.input_dir)
+    if args.merge:
+        output_dir = Extraction.get_output_directory()
+        merged = args.store or os.path.join(output_dir, 'results.sqlite')
+        sources = sorted(glob.glob(os.path.join(output_dir, 'results-*.sqlite')))
+        copied = merge_stores(merged, sources)
+        print(f"Merged {copied} files from {len(sources)} node stores into {merged}")
+    elif not os.path.exists(input_dir):
+        print(f"Error: The input directory '{input_dir}' does not exist.")
+    else:
+        output_dir = Extraction.get_output_directory()
+        node_id = args.node_id or socket.gethostname()
+        leases = LeaseDirectory(args.lease_dir or os.path.join(output_dir, 'leases'), input_dir, node_id, args.lease_ttl)
+        metrics_log = Metrics.MetricsLog(args.metrics or os.path.join(output_dir, f'metrics-{node_id}.jsonl'))
+        # SQLite locking is unreliable on NFS, so every node writes its own database; --merge combines them.
+        store = None
+        if (args.store or '').lower() != 'none':
+            store = SqliteStore(args.store or os.path.join(output_dir, f'results-{node_id}.sqlite'))
+        try:
+            run_node(input_dir, leases, args.workers, args.force, metrics_log, store, args.ocr, args.excel,
+                     args.classify_pages, args.reuse)
+        finally:
+            if store is not None:
+                store.close()
+            metrics_log.close()
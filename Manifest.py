@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 hash of a file's content, reading it in chunks.
+
+    Parameters:
+    file_path (str): The path to the file.
+    chunk_size (int, optional): Number of bytes read at a time. Defaults to 1 MiB.
+
+    Returns:
+    str: The hexadecimal digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Persistent record of the input files that have already been extracted, used to skip unchanged files
+    on the next run.
+
+    Each entry is keyed by the file path relative to the input directory and holds the content hash,
+    size, modification time, the extractor version that produced the outputs, the output files written
+    and, when the rows went to a result store, the store and the key of the file's row in it.
+
+    Attributes:
+    path (str): The path of the JSON manifest file.
+    root (str): The input directory the entry keys are relative to.
+    entries (dict): The manifest entries keyed by relative file path.
+    """
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = root
+        self.entries = {}
+        self._stores = {}  # store path -> (inode, open connection)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable manifest {path}: {e}")
+
+    def key(self, file_path):
+        """
+        Returns the manifest key of a file, its path relative to the input directory.
+
+        Parameters:
+        file_path (str): The path to the input file.
+
+        Returns:
+        str: The relative path using forward slashes.
+        """
+        return os.path.relpath(os.path.abspath(file_path), os.path.abspath(self.root)).replace(os.sep, '/')
+
+    def is_current(self, file_path, extractor_version):
+        """
+        Checks whether a file was already extracted by this extractor version and is unchanged since.
+        The size and modification time are compared first; the content is only hashed when they differ,
+        so a touched but identical file is still recognised as unchanged.
+
+        Parameters:
+        file_path (str): The path to the input file.
+        extractor_version (str): The version of the extraction rules currently in use.
+
+        Returns:
+        bool: True if the file can be skipped, False if it needs to be processed.
+        """
+        entry = self.entries.get(self.key(file_path))
+        if entry is None or entry.get("extractor_version") != extractor_version:
+            return False
+        if not all(os.path.exists(output) for output in entry.get("outputs", [])):
+            return False
+        store = entry.get("store")
+        if store is not None and not self._stored(store["path"], store["file_path"]):
+            return False
+
+        stat = os.stat(file_path)
+        if stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns"):
+            return True
+        if stat.st_size != entry.get("size") or file_digest(file_path) != entry.get("sha256"):
+            return False
+
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def _stored(self, path, file_path):
+        """
+        Checks whether a result store still has the row of a file in its files table.
+
+        Parameters:
+        path (str): The path of the SQLite result store.
+        file_path (str): The key of the file's row.
+
+        Returns:
+        bool: False if the store or the row was deleted.
+        """
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            return False
+        cached = self._stores.get(path)
+        if cached is None or cached[0] != inode:
+            # A replaced store is a different file; the old connection would still read the deleted one.
+            if cached is not None:
+                cached[1].close()
+            cached = self._stores[path] = (inode, sqlite3.connect(path, check_same_thread=False))
+        try:
+            row = cached[1].execute("SELECT 1 FROM files WHERE file_path = ?", (file_path,)).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None
+
+    def record(self, file_path, extractor_version, outputs, store=None):
+        """
+        Records a file as extracted.
+
+        Parameters:
+        file_path (str): The path to the input file.
+        extractor_version (str): The version of the extraction rules that produced the outputs.
+        outputs (list of str): The paths of the output files written for this input.
+        store (str, optional): The path of the result store the rows were written to; the file is no longer
+        current once the store or its row is deleted. Defaults to None.
+
+        Returns:
+        None
+        """
+        stat = os.stat(file_path)
+        entry = {
+            "sha256": file_digest(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "extractor_version": extractor_version,
+            "outputs": list(outputs),
+        }
+        if store is not None:
+            entry["store"] = {"path": os.path.abspath(store), "file_path": file_path}
+        self.entries[self.key(file_path)] = entry
+
+    def save(self):
+        """
+        Writes the manifest to disk, replacing the previous file atomically.
+
+        Returns:
+        None
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".manifest.", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"files": self.entries}, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
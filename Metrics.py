@@ -0,0 +1,229 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Metrics of the file currently being processed by this process, set by begin_file().
+_current = None
+
+
+class FileMetrics:
+    """
+    Stage timings and counters collected while processing one file.
+
+    Attributes:
+    file_path (str): The path to the PDF file.
+    year (str): The year associated with the file.
+    model (str): The model of the item.
+    stages (dict): Seconds spent in each stage. Nested stages are timed inclusively.
+    counters (dict): Counts of pages, lines, records, warnings and failures.
+    """
+
+    def __init__(self, file_path, year=None, model=None):
+        self.file_path = file_path
+        self.year = year
+        self.model = model
+        self.stages = {}
+        self.counters = {"pages": 0, "lines": 0, "records": 0, "warnings": 0, "failures": 0}
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def as_dict(self):
+        """
+        Returns the metrics as a JSON serialisable dict.
+
+        Returns:
+        dict: file_path, year, model, total seconds, stage seconds and counters.
+        """
+        return {
+            "file_path": self.file_path,
+            "year": self.year,
+            "model": self.model,
+            "seconds": self.seconds,
+            "stages": dict(self.stages),
+            **self.counters,
+        }
+
+
+def begin_file(file_path, year=None, model=None):
+    """
+    Starts collecting metrics for a file. Stages and counters recorded until end_file() are attributed to it.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    year (str, optional): The year associated with the file.
+    model (str, optional): The model of the item.
+
+    Returns:
+    FileMetrics: The metrics of the file.
+    """
+    global _current
+    _current = FileMetrics(file_path, year, model)
+    return _current
+
+
+def end_file():
+    """
+    Stops collecting metrics for the current file.
+
+    Returns:
+    dict: The metrics of the file, or None if begin_file() was not called.
+    """
+    global _current
+    metrics, _current = _current, None
+    if metrics is None:
+        return None
+    metrics.seconds = time.perf_counter() - metrics.started
+    return metrics.as_dict()
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a pipeline stage of the current file. Does nothing but time the block when no file is active.
+
+    Parameters:
+    name (str): The stage name, e.g. "read" or "extract".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _current is not None:
+            _current.stages[name] = _current.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def count(name, value=1):
+    """
+    Adds to a counter of the current file.
+
+    Parameters:
+    name (str): The counter name, e.g. "pages" or "records".
+    value (int, optional): The amount to add. Defaults to 1.
+
+    Returns:
+    None
+    """
+    if _current is not None:
+        _current.counters[name] = _current.counters.get(name, 0) + value
+
+
+def percentiles(values):
+    """
+    Summarises latencies with nearest-rank percentiles.
+
+    Parameters:
+    values (list of float): The latencies in seconds.
+
+    Returns:
+    dict: count, mean, p50, p90, p95, p99 and max, in milliseconds.
+    """
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "p50": rank(50),
+        "p90": rank(90),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": ordered[-1] * 1000,
+    }
+
+
+class MetricsLog:
+    """
+    Writes the metrics of every processed file as one JSON line and builds an end-of-run summary.
+
+    Attributes:
+    path (str): The path of the JSON lines file, or None to only build the summary.
+    records (list of dict): The per-file metrics written so far.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self.started = time.perf_counter()
+        self._file = None
+        if path is not None:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, metrics):
+        """
+        Writes the metrics of one file.
+
+        Parameters:
+        metrics (dict): The metrics as returned by end_file().
+
+        Returns:
+        None
+        """
+        if metrics is None:
+            return
+        self.records.append(metrics)
+        if self._file is not None:
+            self._file.write(json.dumps(metrics) + '\n')
+            self._file.flush()
+
+    def summary(self, slowest=10):
+        """
+        Summarises the run: totals, per-stage latency percentiles and the slowest files.
+
+        Parameters:
+        slowest (int, optional): The number of slowest files to list. Defaults to 10.
+
+        Returns:
+        dict: The run summary.
+        """
+        stage_names = sorted({name for record in self.records for name in record["stages"]})
+        totals = {}
+        for name in ("pages", "lines", "records", "warnings", "failures"):
+            totals[name] = sum(record.get(name, 0) for record in self.records)
+        return {
+            "summary": True,
+            "files": len(self.records),
+            "wall_seconds": time.perf_counter() - self.started,
+            **totals,
+            "stages": {
+                name: {
+                    "total_seconds": sum(record["stages"].get(name, 0.0) for record in self.records),
+                    **percentiles([record["stages"][name] for record in self.records if name in record["stages"]]),
+                }
+                for name in stage_names
+            },
+            "slowest": [
+                {"file_path": record["file_path"], "seconds": record["seconds"]}
+                for record in sorted(self.records, key=lambda record: record["seconds"] or 0, reverse=True)[:slowest]
+            ],
+        }
+
+    def close(self, stream=sys.stdout):
+        """
+        Writes the end-of-run summary as the last JSON line, prints it and closes the file.
+
+        Parameters:
+        stream (file, optional): Where the summary is printed. Defaults to stdout; None prints nothing.
+
+        Returns:
+        dict: The run summary.
+        """
+        summary = self.summary()
+        if self._file is not None:
+            self._file.write(json.dumps(summary) + '\n')
+            self._file.close()
+            self._file = None
+        if stream is not None:
+            print(f"Processed {summary['files']} files ({summary['pages']} pages, {summary['records']} records, "
+                  f"{summary['failures']} failures) in {summary['wall_seconds']:.2f}s", file=stream)
+            for name, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+                print(f"  {name:<14} total {stats['total_seconds']:8.2f}s  p50 {stats['p50']:8.2f} ms  "
+                      f"p95 {stats['p95']:8.2f} ms", file=stream)
+        return summary
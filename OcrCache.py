@@ -0,0 +1,80 @@
+import hashlib
+import os
+from DiskCache import DiskCache
+
+CACHE_DIR = os.environ.get(
+    "OCR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ocr')
+)
+MAX_BYTES = 256 * 1024 * 1024
+
+_default_cache = None
+
+
+class OcrCache(DiskCache):
+    """
+    Persistent cache of OCR results, one small text file per image, keyed by a hash of the decoded image
+    and the Tesseract configuration. Entries are evicted least recently used first (see DiskCache).
+
+    Attributes:
+    directory (str): The cache directory.
+    max_bytes (int): The size the cache is trimmed back to.
+    """
+
+    suffix = '.txt'
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def key(image, config=""):
+        """
+        Computes the cache key of an image.
+
+        Parameters:
+        image (PIL.Image): The decoded image.
+        config (str, optional): The Tesseract language and options the image is OCRed with. Defaults to "".
+
+        Returns:
+        str: The hexadecimal SHA-256 of the image mode, size, pixels and configuration.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode}:{image.size}:{config}\0".encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def encode(self, value):
+        """
+        Converts a cached value to the bytes stored on disk.
+
+        Parameters:
+        value (str): The OCR result.
+
+        Returns:
+        bytes: The UTF-8 encoded text.
+        """
+        return value.encode('utf-8')
+
+    def decode(self, data):
+        """
+        Converts the bytes stored on disk back to the cached value.
+
+        Parameters:
+        data (bytes): The stored bytes.
+
+        Returns:
+        str: The OCR result.
+        """
+        return data.decode('utf-8')
+
+
+def get_default_cache():
+    """
+    Returns the OCR cache of this process, opening it on first use.
+
+    Returns:
+    OcrCache: The cache in CACHE_DIR.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = OcrCache()
+    return _default_cache
@@ -0,0 +1,191 @@
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+
+# Columns returned for every matching spec row
+COLUMNS = [
+    "year", "model", "file_path", "row", "heading", "data_code", "description", "weight_front", "weight_rear",
+    "retail_price",
+]
+
+
+def connect(db_path):
+    """
+    Opens a result store read-only.
+
+    Parameters:
+    db_path (str): The path of the SQLite result store.
+
+    Returns:
+    sqlite3.Connection: The connection.
+    """
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def has_search_index(connection):
+    """
+    Checks whether the store has the full-text index over descriptions.
+
+    Parameters:
+    connection (sqlite3.Connection): The store connection.
+
+    Returns:
+    bool: True if the spec_search table exists.
+    """
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'spec_search'").fetchone() is not None
+
+
+def match_expression(text):
+    """
+    Turns free text into an FTS5 query matching rows that contain every word. Words ending in * match
+    as prefixes.
+
+    Parameters:
+    text (str): The words to search for, e.g. "cruise control" or "alumin*".
+
+    Returns:
+    str: The FTS5 match expression.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return ' '.join(terms)
+
+
+def option_filter(connection, code=None, text=None, years=None, models=None):
+    """
+    Builds the WHERE clause selecting spec rows.
+
+    Parameters:
+    connection (sqlite3.Connection): The store connection.
+    code (str, optional): The data code, e.g. "001-172"; a trailing * matches every code with that prefix.
+    text (str, optional): Words that must all appear in the data code or description.
+    years (tuple, optional): The first and last year, both included.
+    models (list of str, optional): The models to search.
+
+    Returns:
+    tuple: The SQL condition and its parameters.
+    """
+    conditions = []
+    parameters = []
+    if code:
+        if code.endswith('*'):
+            conditions.append("spec.data_code GLOB ?")
+            parameters.append(code.rstrip('*').replace('[', '[[]') + '*')
+        else:
+            conditions.append("spec.data_code = ?")
+            parameters.append(code)
+    if text:
+        if has_search_index(connection):
+            conditions.append("spec.rowid IN (SELECT rowid FROM spec_search WHERE spec_search MATCH ?)")
+            parameters.append(match_expression(text))
+        else:
+            for word in text.split():
+                conditions.append("(spec.description LIKE ? OR spec.data_code LIKE ?)")
+                parameters += [f"%{word.rstrip('*')}%"] * 2
+    if years:
+        conditions.append("spec.year BETWEEN ? AND ?")
+        parameters += [str(years[0]), str(years[1])]
+    if models:
+        conditions.append(f"spec.model IN ({', '.join('?' * len(models))})")
+        parameters += list(models)
+    return (' AND '.join(conditions) or '1'), parameters
+
+
+def find_options(connection, code=None, text=None, years=None, models=None, limit=None):
+    """
+    Finds the work orders that have an option.
+
+    Parameters:
+    connection (sqlite3.Connection): The store connection.
+    code (str, optional): The data code, e.g. "001-172"; a trailing * matches every code with that prefix.
+    text (str, optional): Words that must all appear in the data code or description.
+    years (tuple, optional): The first and last year, both included.
+    models (list of str, optional): The models to search.
+    limit (int, optional): The maximum number of rows returned. Defaults to None, which returns all rows.
+
+    Returns:
+    list of dict: The matching spec rows with the COLUMNS keys, ordered by year, model and file.
+    """
+    where, parameters = option_filter(connection, code, text, years, models)
+    query = (f"SELECT {', '.join('spec.' + column for column in COLUMNS)} FROM spec WHERE {where} "
+             f"ORDER BY spec.year, spec.model, spec.file_path, spec.row")
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return [dict(zip(COLUMNS, values)) for values in connection.execute(query, parameters)]
+
+
+def price_summary(connection, code=None, text=None, years=None, models=None):
+    """
+    Summarises the retail prices paid for an option per year.
+
+    Parameters:
+    connection (sqlite3.Connection): The store connection.
+    code (str, optional): The data code; a trailing * matches every code with that prefix.
+    text (str, optional): Words that must all appear in the data code or description.
+    years (tuple, optional): The first and last year, both included.
+    models (list of str, optional): The models to search.
+
+    Returns:
+    list of dict: Per year and data code, the number of "work_orders" and the "min", "avg", "max" and "total"
+    retail price.
+    """
+    where, parameters = option_filter(connection, code, text, years, models)
+    query = (
+        "SELECT spec.year, spec.data_code, COUNT(DISTINCT spec.file_path), MIN(spec.retail_price), "
+        "AVG(spec.retail_price), MAX(spec.retail_price), SUM(spec.retail_price) "
+        f"FROM spec WHERE {where} GROUP BY spec.year, spec.data_code ORDER BY spec.year, spec.data_code"
+    )
+    keys = ["year", "data_code", "work_orders", "min", "avg", "max", "total"]
+    return [dict(zip(keys, values)) for values in connection.execute(query, parameters)]
+
+
+def parse_years(value):
+    """
+    Parses a year or a range of years.
+
+    Parameters:
+    value (str): "2020" or "2019-2021".
+
+    Returns:
+    tuple: The first and last year.
+    """
+    first, _, last = value.partition('-')
+    return first, last or first
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the options of every work order in the SQLite result store.")
+    parser.add_argument("database", help="Path of the SQLite result store.")
+    parser.add_argument("--code", default=None, help="Data code, e.g. 001-172; a trailing * matches a prefix.")
+    parser.add_argument("--text", default=None, help="Words that must all appear in the description.")
+    parser.add_argument("--years", type=parse_years, default=None, help="Year or range of years, e.g. 2019-2021.")
+    parser.add_argument("--model", action="append", default=None, help="Model to search; may be repeated.")
+    parser.add_argument("--summary", action="store_true", help="Summarise the retail prices per year instead of listing rows.")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of rows listed.")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv", help="Output format. Defaults to csv.")
+    args = parser.parse_args()
+
+    if not args.code and not args.text:
+        parser.error("give --code and/or --text")
+    connection = connect(args.database)
+    started = time.perf_counter()
+    if args.summary:
+        rows = price_summary(connection, args.code, args.text, args.years, args.model)
+    else:
+        rows = find_options(connection, args.code, args.text, args.years, args.model, args.limit)
+    elapsed = time.perf_counter() - started
+    if args.format == "json":
+        json.dump(rows, sys.stdout, indent=1)
+        print()
+    elif rows:
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"{len(rows)} rows in {elapsed * 1000:.1f} ms", file=sys.stderr)
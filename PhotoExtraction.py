@@ -2,11 +2,39 @@ import fitz  # PyMuPDF
 import pytesseract
 from PIL import Image
 import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from OcrCache import get_default_cache
 
 # Path to Tesseract executable (if needed)
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-def pdf_photo_to_text(pdf_path):
+def image_to_text(image, config="", use_cache=True):
+    """
+    OCRs an image with Tesseract, looking the result up in the OCR cache first so repeated logos,
+    letterheads and stamped pages are only OCRed once.
+
+    Parameters:
+    image (PIL.Image): The image to read.
+    config (str, optional): Extra Tesseract options. Defaults to "".
+    use_cache (bool, optional): Read and update the OCR cache. Defaults to True.
+
+    Returns:
+    str: The recognised text.
+    """
+    if not use_cache:
+        return pytesseract.image_to_string(image, config=config)
+    cache = get_default_cache()
+    key = cache.key(image, config)
+    text = cache.get(key)
+    if text is None:
+        text = pytesseract.image_to_string(image, config=config)
+        cache.put(key, text)
+    return text
+
+
+def pdf_photo_to_text(pdf_path, use_cache=True):
     # Open the PDF file
     doc = fitz.open(pdf_path)
     text = ""
@@ -25,7 +53,7 @@ def pdf_photo_to_text(pdf_path):
             image = Image.open(io.BytesIO(image_bytes))
 
             # Apply OCR to the image
-            page_text = pytesseract.image_to_string(image)
+            page_text = image_to_text(image, use_cache=use_cache)
 
             # Append the OCR result to the text
             text += f"Page {page_num + 1}, Image {image_index + 1}:\n"
@@ -33,12 +61,58 @@ def pdf_photo_to_text(pdf_path):
     
     return text
 
-# Usage example
-pdf_path = "your_photo_pdf.pdf"  # Replace with the path to your photo PDF
-extracted_text = pdf_photo_to_text(pdf_path)
 
-# Save the extracted text to a text file
-with open("output_text.txt", "w") as text_file:
-    text_file.write(extracted_text)
+def ocr_page(pdf_path, page_number, dpi=300, use_cache=True):
+    """
+    Rasterizes one page of a PDF and reads its text with Tesseract.
+
+    Parameters:
+    pdf_path (str): The path to the PDF file.
+    page_number (int): The zero-based index of the page.
+    dpi (int, optional): The resolution the page is rendered at. Defaults to 300.
+    use_cache (bool, optional): Read and update the OCR cache. Defaults to True.
+
+    Returns:
+    str: The text recognised on the page.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        pixmap = doc.load_page(page_number).get_pixmap(dpi=dpi, alpha=False)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    finally:
+        doc.close()
+    return image_to_text(image, use_cache=use_cache)
+
+
+def ocr_pages(pdf_path, page_numbers, workers=None, dpi=300):
+    """
+    OCRs several pages of a PDF in a pool of worker processes.
+
+    Parameters:
+    pdf_path (str): The path to the PDF file.
+    page_numbers (list of int): The zero-based indexes of the pages to OCR.
+    workers (int, optional): Number of worker processes. Defaults to the number of CPUs; 1 runs serially.
+    dpi (int, optional): The resolution pages are rendered at. Defaults to 300.
+
+    Returns:
+    dict: The recognised text keyed by page index.
+    """
+    page_numbers = list(page_numbers)
+    workers = min(workers or os.cpu_count() or 1, len(page_numbers))
+    if workers <= 1:
+        return {page_number: ocr_page(pdf_path, page_number, dpi) for page_number in page_numbers}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        texts = executor.map(ocr_page, repeat(pdf_path), page_numbers, repeat(dpi))
+        return dict(zip(page_numbers, texts))
+
+
+if __name__ == "__main__":
+    # Usage example
+    pdf_path = "your_photo_pdf.pdf"  # Replace with the path to your photo PDF
+    extracted_text = pdf_photo_to_text(pdf_path)
+
+    # Save the extracted text to a text file
+    with open("output_text.txt", "w") as text_file:
+        text_file.write(extracted_text)
 
-print("Text extraction from photo PDF completed!")
+    print("Text extraction from photo PDF completed!")
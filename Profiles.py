@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import re
+
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles.json')
+
+_registry = None
+
+
+class Profile:
+    """
+    A document type definition from profiles.json, compiled once into the structures the extractors use.
+
+    Attributes:
+    name (str): The name of the document type, e.g. "spec" or "quote".
+    extractor (str): The extraction method used for this document type, "spec" or "quote".
+    markers (tuple of str): Classification markers, matched case-insensitively and ignoring spaces.
+    definition (dict): The raw definition as loaded from the profiles file.
+    headings (frozenset of str): Section headings of the specification, for O(1) lookups per line.
+    weight_heading_pattern (Pattern): Matches a weight summary heading at the start of a line.
+    """
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.name = definition["name"]
+        self.extractor = definition.get("extractor", self.name)
+        self.markers = tuple(definition.get("markers", []))
+        self.headings = frozenset(definition.get("headings", []))
+        self.weight_headings = tuple(definition.get("weight_headings", []))
+        self.weight_heading_pattern = re.compile(
+            '|'.join(re.escape(heading) for heading in self.weight_headings) or '(?!)'
+        )
+
+    def get(self, key, default=None):
+        """
+        Returns a value from the raw definition.
+
+        Parameters:
+        key (str): The definition key, e.g. "spec_crop".
+        default (optional): The value returned when the key is missing. Defaults to None.
+
+        Returns:
+        The definition value, or default.
+        """
+        return self.definition.get(key, default)
+
+
+class ProfileRegistry:
+    """
+    The loaded document type profiles, in priority order.
+    All classification markers are compiled into a single regular expression, so classifying a document
+    is one scan over its text no matter how many profiles are registered.
+
+    Attributes:
+    profiles (list of Profile): The profiles, highest priority first.
+    digest (str): The SHA-256 hash of the definitions, which changes whenever an extraction rule is edited.
+    """
+
+    def __init__(self, definitions):
+        self.profiles = [Profile(definition) for definition in definitions]
+        self.digest = hashlib.sha256(json.dumps(definitions, sort_keys=True).encode('utf-8')).hexdigest()
+        self._by_name = {profile.name: profile for profile in self.profiles}
+        self._by_group = {}
+        alternatives = []
+        for priority, profile in enumerate(self.profiles):
+            for index, marker in enumerate(profile.markers):
+                group = f"p{priority}_{index}"
+                self._by_group[group] = priority
+                # Markers are matched the way start() used to: lower-cased with all spaces removed.
+                spaced = ' *'.join(re.escape(char) for char in marker.replace(' ', ''))
+                alternatives.append(f"(?P<{group}>{spaced})")
+        self._marker_pattern = re.compile('|'.join(alternatives) or '(?!)', re.IGNORECASE)
+
+    def get(self, name):
+        """
+        Returns the profile with the given name.
+
+        Parameters:
+        name (str): The profile name.
+
+        Returns:
+        Profile: The profile, or None if no profile has this name.
+        """
+        return self._by_name.get(name)
+
+    def classify(self, text):
+        """
+        Determines the document type of a text. When markers of several profiles are present, the profile
+        listed first in the profiles file wins.
+
+        Parameters:
+        text (str): The document text.
+
+        Returns:
+        Profile: The matching profile, or None if no marker is found.
+        """
+        best = None
+        for match in self._marker_pattern.finditer(text):
+            priority = self._by_group[match.lastgroup]
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+        return None if best is None else self.profiles[best]
+
+
+def load_profiles(path=None):
+    """
+    Loads and compiles the document type profiles from a JSON file.
+
+    Parameters:
+    path (str, optional): The path to the profiles file. Defaults to profiles.json next to this script.
+
+    Returns:
+    ProfileRegistry: The compiled profiles.
+    """
+    with open(path or PROFILES_PATH, 'r', encoding='utf-8') as f:
+        return ProfileRegistry(json.load(f))
+
+
+def get_registry():
+    """
+    Returns the default profile registry, loading it on first use so every later call is free.
+
+    Returns:
+    ProfileRegistry: The compiled profiles from profiles.json.
+    """
+    global _registry
+    if _registry is None:
+        _registry = load_profiles()
+    return _registry
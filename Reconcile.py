@@ -0,0 +1,111 @@
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+VEHICLE_PRICE = "VEHICLE PRICE"
+KEYS = ["year", "model"]
+
+
+def load_frames(db_path):
+    """
+    Loads the spec totals and the quote lines of every work order from the SQLite result store.
+    The spec rows are summed per file in SQLite, so only one row per spec file is transferred.
+
+    Parameters:
+    db_path (str): The path of the SQLite result store.
+
+    Returns:
+    tuple of DataFrame: The spec totals per file (year, model, spec_file, options, spec_total,
+    spec_weight_front, spec_weight_rear, factory_weight) and the quote lines (year, model, quote_file,
+    line_item, units, price_per_unit, total_price).
+    """
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        spec = pd.read_sql_query(
+            "SELECT spec.year, spec.model, spec.file_path AS spec_file, COUNT(*) AS options, "
+            "TOTAL(spec.retail_price) AS spec_total, TOTAL(spec.weight_front) AS spec_weight_front, "
+            "TOTAL(spec.weight_rear) AS spec_weight_rear, "
+            "(SELECT weight_summary.total_weight FROM weight_summary WHERE weight_summary.file_path = spec.file_path "
+            " AND weight_summary.heading = 'Factory Weight') AS factory_weight "
+            "FROM spec GROUP BY spec.year, spec.model, spec.file_path",
+            connection,
+            dtype={"options": "int64", "spec_total": "float64", "spec_weight_front": "float64",
+                   "spec_weight_rear": "float64", "factory_weight": "float64"},
+        )
+        quote = pd.read_sql_query(
+            "SELECT year, model, file_path AS quote_file, line_item, units, price_per_unit, total_price FROM quote",
+            connection,
+            dtype={"units": "float64", "price_per_unit": "float64", "total_price": "float64"},
+        )
+    finally:
+        connection.close()
+    return spec, quote
+
+
+def reconcile(spec, quote, tolerance=0.01, minimum=1.0):
+    """
+    Joins the spec totals and quotes of every work order by year and model and flags the work orders
+    whose quoted vehicle price does not match the spec retail total. All computations are vectorized.
+
+    Parameters:
+    spec (DataFrame): The spec totals per file, as returned by load_frames().
+    quote (DataFrame): The quote lines, as returned by load_frames().
+    tolerance (float, optional): Allowed difference as a fraction of the quoted vehicle price. Defaults to 0.01.
+    minimum (float, optional): Allowed difference in dollars regardless of the price. Defaults to 1.0.
+
+    Returns:
+    DataFrame: One row per spec file and quote file of a work order, with the quoted vehicle price, units
+    and quote total, the spec retail total and weight sums, the delta and relative delta, and a status:
+    "ok", "mismatch", "unpriced spec" (every retail price is 0), "no vehicle price", "no quote" or "no spec".
+    """
+    is_vehicle = quote["line_item"].str.strip().str.upper() == VEHICLE_PRICE
+    vehicle = quote.loc[is_vehicle, KEYS + ["quote_file", "units", "price_per_unit", "total_price"]].rename(
+        columns={"units": "quoted_units", "price_per_unit": "quoted_vehicle_price", "total_price": "quoted_vehicle_total"}
+    )
+    vehicle = vehicle.drop_duplicates("quote_file")
+    lines = quote.groupby("quote_file").agg(quote_lines=("line_item", "size"))
+    quotes = quote[KEYS + ["quote_file"]].drop_duplicates("quote_file").merge(lines, on="quote_file")
+    quotes = quotes.merge(vehicle, on=KEYS + ["quote_file"], how="left")
+    report = spec.merge(quotes, on=KEYS, how="outer")
+
+    report["delta"] = report["quoted_vehicle_price"] - report["spec_total"]
+    report["relative_delta"] = report["delta"] / report["quoted_vehicle_price"].where(report["quoted_vehicle_price"] != 0)
+    allowed = np.maximum(minimum, tolerance * report["quoted_vehicle_price"].abs())
+    report["status"] = np.select(
+        [
+            report["spec_file"].isna(),
+            report["quote_file"].isna(),
+            report["quoted_vehicle_price"].isna(),
+            report["spec_total"] == 0,
+            report["delta"].abs() > allowed,
+        ],
+        ["no spec", "no quote", "no vehicle price", "unpriced spec", "mismatch"],
+        default="ok",
+    )
+    return report.sort_values(KEYS + ["spec_file", "quote_file"], na_position="last").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile the quoted vehicle price with the spec retail total of every work order.")
+    parser.add_argument("database", help="Path of the SQLite result store.")
+    parser.add_argument("--output", default=None,
+                        help="CSV report. Defaults to 'reconciliation.csv' next to the database.")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Allowed difference as a fraction of the quoted vehicle price. Defaults to 0.01.")
+    parser.add_argument("--minimum", type=float, default=1.0,
+                        help="Allowed difference in dollars regardless of the price. Defaults to 1.0.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    spec, quote = load_frames(args.database)
+    loaded = time.perf_counter()
+    report = reconcile(spec, quote, args.tolerance, args.minimum)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.database)), 'reconciliation.csv')
+    report.to_csv(output, index=False)
+    print(f"Reconciled {len(report)} spec/quote pairs in {time.perf_counter() - started:.2f}s "
+          f"(loading {loaded - started:.2f}s); report written to {output}")
+    for status, count in report["status"].value_counts().items():
+        print(f"  {status:<17}{count}")
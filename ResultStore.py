@@ -0,0 +1,288 @@
+import os
+import sqlite3
+import time
+
+# Columns of every table, with their SQLite types. year, model and file_path are indexed in all of them.
+TABLES = {
+    "spec": [
+        ("heading", "TEXT"), ("data_code", "TEXT"), ("description", "TEXT"), ("weight_front", "INTEGER"),
+        ("weight_rear", "INTEGER"), ("retail_price", "REAL"),
+    ],
+    "warranty": [
+        ("heading", "TEXT"), ("data_code", "TEXT"), ("description", "TEXT"), ("weight_front", "INTEGER"),
+        ("weight_rear", "INTEGER"), ("retail_price", "REAL"),
+    ],
+    "quote": [
+        ("line_item", "TEXT"), ("units", "INTEGER"), ("price_per_unit", "REAL"), ("total_price", "REAL"),
+    ],
+    "weight_summary": [
+        ("heading", "TEXT"), ("weight_front", "INTEGER"), ("weight_rear", "INTEGER"), ("total_weight", "INTEGER"),
+    ],
+}
+
+# Result table name returned by start() -> store table name
+RESULT_TABLES = {"Spec": "spec", "Warranty": "warranty", "Quote": "quote", "WeightSummary": "weight_summary"}
+
+
+def to_int(value):
+    """
+    Converts an extracted value to an integer.
+
+    Parameters:
+    value: The extracted value, e.g. 4641, '82,025' or ''.
+
+    Returns:
+    int: The value, or None if it is empty or not a number.
+    """
+    number = to_float(value)
+    return None if number is None else int(number)
+
+
+def to_float(value):
+    """
+    Converts an extracted value to a float.
+
+    Parameters:
+    value: The extracted value, e.g. 1234.0, '82,025' or ''.
+
+    Returns:
+    float: The value, or None if it is empty or not a number.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        return float(str(value).replace(',', '').replace('$', ''))
+    except ValueError:
+        return None
+
+
+def typed_rows(table, rows):
+    """
+    Converts the rows of a result table to the typed columns of the store.
+
+    Parameters:
+    table (str): The store table name, e.g. "spec".
+    rows (list of list): The rows as returned by the extractors.
+
+    Returns:
+    list of tuple: The typed values of the table columns, without year, model and file_path.
+    """
+    if table in ("spec", "warranty"):
+        return [(row[0], row[1], row[2], to_int(row[3]), to_int(row[4]), to_float(row[5])) for row in rows]
+    if table == "quote":
+        return [(row[0], to_int(row[1]), to_float(row[2]), to_float(row[3])) for row in rows]
+    return [(row[0], to_int(row[1]), to_int(row[2]), to_int(row[3])) for row in rows]
+
+
+class SqliteStore:
+    """
+    Consolidated result store: the Spec, Warranty, Quote and WeightSummary rows of every work order in
+    one indexed SQLite database. Results are buffered and inserted batch_size files per transaction;
+    re-processing a file replaces its earlier rows. The files table records when each file was extracted,
+    so stores written by several nodes can be merged with merge_stores().
+
+    Attributes:
+    path (str): The path of the database file.
+    batch_size (int): The number of files written per transaction.
+    """
+
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for table, columns in TABLES.items():
+                definitions = ", ".join(f"{name} {kind}" for name, kind in columns)
+                self.connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} (year TEXT, model TEXT, file_path TEXT, row INTEGER, "
+                    f"{definitions})"
+                )
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_year_model ON {table} (year, model, file_path)"
+                )
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_file ON {table} (file_path)")
+            # Covers the option queries of OptionQuery.py, which then never read the table itself.
+            self.connection.execute("DROP INDEX IF EXISTS spec_data_code")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS spec_option ON spec (data_code, year, model, file_path, retail_price)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS files (file_path TEXT PRIMARY KEY, year TEXT, model TEXT, "
+                "extracted_at REAL)"
+            )
+            create_search_index(self.connection)
+
+    def write(self, result):
+        """
+        Queues the tables of a processed file, flushing once batch_size files are queued.
+
+        Parameters:
+        result (dict): A result as returned by start().
+
+        Returns:
+        None
+        """
+        if "error" in result:
+            return
+        self._pending.append((time.time(), result))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every queued file in a single transaction.
+
+        Returns:
+        None
+        """
+        if not self._pending:
+            return
+        with self.connection:
+            for extracted_at, result in self._pending:
+                key = (result["year"], result["model"], result["file_path"])
+                for table in TABLES:
+                    self.connection.execute(f"DELETE FROM {table} WHERE file_path = ?", (result["file_path"],))
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                    (result["file_path"], result["year"], result["model"], extracted_at),
+                )
+                for name, rows in result["tables"].items():
+                    table = RESULT_TABLES.get(name)
+                    if table is None or not rows:
+                        continue
+                    placeholders = ", ".join("?" * (4 + len(TABLES[table])))
+                    self.connection.executemany(
+                        f"INSERT INTO {table} VALUES ({placeholders})",
+                        (key + (index,) + values for index, values in enumerate(typed_rows(table, rows))),
+                    )
+        self._pending.clear()
+
+    def close(self):
+        """
+        Flushes the queued files and closes the database.
+
+        Returns:
+        None
+        """
+        self.flush()
+        self.connection.close()
+
+
+def merge_stores(db_path, sources):
+    """
+    Merges result stores written separately, e.g. one per node by Leases.py, into one store. A file found
+    in several stores, because it was re-extracted by another node in a forced run, keeps only the rows of
+    its latest extraction, and files the target already holds from a later extraction are left alone, so
+    merging again after further runs adds no duplicates.
+
+    Parameters:
+    db_path (str): The path of the merged store; created if it does not exist.
+    sources (list of str): The paths of the stores to merge in. db_path itself is skipped.
+
+    Returns:
+    int: The number of files copied into the merged store.
+    """
+    store = SqliteStore(db_path)
+    connection = store.connection
+    copied = 0
+    try:
+        for source in sources:
+            if os.path.abspath(source) == os.path.abspath(db_path):
+                continue
+            connection.execute("ATTACH DATABASE ? AS source", (source,))
+            try:
+                if connection.execute("SELECT 1 FROM source.sqlite_master WHERE name = 'files'").fetchone() is None:
+                    print(f"Warning: Skipping {source}: it does not record when its files were extracted.")
+                    continue
+                with connection:
+                    connection.execute("CREATE TEMP TABLE merged AS SELECT new.* FROM source.files AS new "
+                                       "LEFT JOIN main.files AS old ON old.file_path = new.file_path "
+                                       "WHERE old.file_path IS NULL OR new.extracted_at > old.extracted_at")
+                    for table in TABLES:
+                        selected = "file_path IN (SELECT file_path FROM merged)"
+                        connection.execute(f"DELETE FROM main.{table} WHERE {selected}")
+                        connection.execute(f"INSERT INTO main.{table} SELECT * FROM source.{table} WHERE {selected}")
+                    connection.execute("INSERT OR REPLACE INTO main.files SELECT * FROM merged")
+                    copied += connection.execute("SELECT COUNT(*) FROM merged").fetchone()[0]
+                    connection.execute("DROP TABLE merged")
+            finally:
+                connection.execute("DETACH DATABASE source")
+    finally:
+        store.close()
+    return copied
+
+
+def create_search_index(connection):
+    """
+    Creates the full-text index over the data codes and descriptions of the spec table. It is an FTS5
+    external-content table kept up to date by triggers, so every insert and delete of spec rows updates
+    it in the same transaction. An index added to an existing store is built from its rows.
+
+    Parameters:
+    connection (sqlite3.Connection): The store connection, inside a transaction.
+
+    Returns:
+    bool: True if the index exists, False if this SQLite build has no FTS5.
+    """
+    exists = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'spec_search'").fetchone()
+    if exists is None:
+        try:
+            # Data codes such as 001-172 and AA6-001 are kept as one token.
+            connection.execute(
+                "CREATE VIRTUAL TABLE spec_search USING fts5(data_code, description, content='spec', "
+                "content_rowid='rowid', tokenize=\"unicode61 tokenchars '-'\")"
+            )
+        except sqlite3.OperationalError as e:
+            print(f"Warning: Full-text search is unavailable ({e}); description queries will scan the spec table.")
+            return False
+        connection.execute("INSERT INTO spec_search (spec_search) VALUES ('rebuild')")
+    connection.execute(
+        "CREATE TRIGGER IF NOT EXISTS spec_search_insert AFTER INSERT ON spec BEGIN "
+        "INSERT INTO spec_search (rowid, data_code, description) VALUES (new.rowid, new.data_code, new.description); "
+        "END"
+    )
+    connection.execute(
+        "CREATE TRIGGER IF NOT EXISTS spec_search_delete AFTER DELETE ON spec BEGIN "
+        "INSERT INTO spec_search (spec_search, rowid, data_code, description) "
+        "VALUES ('delete', old.rowid, old.data_code, old.description); "
+        "END"
+    )
+    return True
+
+
+def export_parquet(db_path, directory):
+    """
+    Exports every table of a result store as Parquet, partitioned by year and model. Needs pandas and pyarrow.
+
+    Parameters:
+    db_path (str): The path of the SQLite result store.
+    directory (str): The directory the tables are written to, one sub-directory per table.
+
+    Returns:
+    None
+    """
+    import pandas as pd
+
+    connection = sqlite3.connect(db_path)
+    try:
+        for table in TABLES:
+            frame = pd.read_sql_query(f"SELECT * FROM {table}", connection)
+            if frame.empty:
+                continue
+            frame.to_parquet(os.path.join(directory, table), partition_cols=["year", "model"], index=False)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the SQLite result store as partitioned Parquet.")
+    parser.add_argument("database", help="Path of the SQLite result store.")
+    parser.add_argument("directory", help="Directory the Parquet tables are written to.")
+    args = parser.parse_args()
+    export_parquet(args.database, args.directory)
@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+# Sheet name -> header row. The columns match the per-work-order Excel files.
+SHEETS = {
+    "Spec": [
+        "Heading", "Data Code", "Description", "Weight Front", "Weight Rear", "Retail Price", "Year", "Work Order",
+        "File Path"
+    ],
+    "Quote": ["Line Items", "Number of Units", "Price per Unit", "Total Price", "Year", "Work Order", "File Path"],
+    "WeightSummary": ["Headings", "Weight Front", "Weight Rear", "Total Weight", "Year", "Model"],
+}
+
+# Result table name returned by start() -> rollup sheet. Warranty rows go on the Spec sheet, as in Spec.xlsx.
+RESULT_SHEETS = {"Spec": "Spec", "Warranty": "Spec", "Quote": "Quote", "WeightSummary": "WeightSummary"}
+
+
+class RollupWriter:
+    """
+    Streams the rows of every processed work order into one workbook per year, with a Spec, Quote and
+    WeightSummary sheet covering all models. The workbooks are openpyxl write-only workbooks, which
+    spool appended rows to disk, so memory stays flat however many work orders are rolled up.
+    Each workbook is written to <output_dir>/<year>/Rollup.xlsx when the writer is closed.
+
+    Attributes:
+    output_dir (str): The output directory containing one folder per year.
+    file_name (str): The name of the rollup workbook in each year folder.
+    """
+
+    def __init__(self, output_dir, file_name='Rollup.xlsx'):
+        self.output_dir = output_dir
+        self.file_name = file_name
+        self._workbooks = {}  # year -> (Workbook, {sheet name: worksheet})
+
+    def _sheets(self, year):
+        if year not in self._workbooks:
+            # Imported here so modules that only need SHEETS do not pay for loading openpyxl.
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            sheets = {}
+            for name, header in SHEETS.items():
+                sheets[name] = workbook.create_sheet(name)
+                sheets[name].append(header)
+            self._workbooks[year] = (workbook, sheets)
+        return self._workbooks[year][1]
+
+    def write(self, result):
+        """
+        Appends the tables of a processed file to the workbook of its year.
+
+        Parameters:
+        result (dict): A result as returned by start().
+
+        Returns:
+        None
+        """
+        if "error" in result:
+            return
+        sheets = None
+        for name, rows in result["tables"].items():
+            sheet = RESULT_SHEETS.get(name)
+            if sheet is None or not rows:
+                continue
+            if sheets is None:
+                sheets = self._sheets(result["year"])
+            for row in rows:
+                sheets[sheet].append(list(row))
+
+    def close(self):
+        """
+        Saves every workbook, writing each to a temporary file first and renaming it into place.
+
+        Returns:
+        list of str: The paths of the written workbooks.
+        """
+        written = []
+        for year, (workbook, _) in self._workbooks.items():
+            destination_dir = os.path.join(self.output_dir, year)
+            os.makedirs(destination_dir, exist_ok=True)
+            destination = os.path.join(destination_dir, self.file_name)
+            fd, temp_path = tempfile.mkstemp(prefix=f".{self.file_name}.", suffix=".xlsx", dir=destination_dir)
+            os.close(fd)
+            try:
+                workbook.save(temp_path)
+                os.replace(temp_path, destination)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            written.append(destination)
+        self._workbooks.clear()
+        return written
@@ -0,0 +1,513 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+import Extraction
+import Fingerprint
+from Manifest import file_digest
+from Metrics import percentiles
+from Profiles import get_registry
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error",
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class HttpError(Exception):
+    """
+    An error answered with an HTTP status and a JSON {"error": message} body.
+
+    Attributes:
+    status (int): The HTTP status code.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def warm_up():
+    """
+    Worker initializer: imports the PDF and fingerprint libraries and compiles the profiles when the pool
+    starts, so requests never pay for interpreter or import startup.
+
+    Returns:
+    None
+    """
+    import pypdf  # noqa: F401
+    import Fingerprint  # noqa: F401
+    get_registry()
+
+
+def extract_batch(jobs):
+    """
+    Worker entry point: extracts a batch of files in one task, so queued requests share a single round
+    trip to the pool.
+
+    Parameters:
+    jobs (list of tuple): (file_path, ocr, classify_pages) of every file.
+
+    Returns:
+    list of dict: Per file, its "type", "tables" and "error" (None on success), as in Extraction.process_file().
+    """
+    results = []
+    for file_path, ocr, classify_pages in jobs:
+        result = Extraction.process_file("", "", file_path, ocr, False, classify_pages)
+        results.append({"type": result["type"], "tables": result["tables"], "error": result.get("error")})
+    return results
+
+
+async def read_request(reader, max_body):
+    """
+    Reads one HTTP/1.1 request. Bodies must have a Content-Length.
+
+    Parameters:
+    reader (asyncio.StreamReader): The connection.
+    max_body (int): The largest accepted body in bytes.
+
+    Returns:
+    tuple: The method, target, lower-cased headers and body, or None if the client closed the connection.
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        raise HttpError(411, "send the body with a Content-Length")
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HttpError(400, "malformed Content-Length")
+    if length < 0:
+        raise HttpError(400, "malformed Content-Length")
+    if length > max_body:
+        raise HttpError(413, f"body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    """
+    Writes a JSON response.
+
+    Parameters:
+    writer (asyncio.StreamWriter): The connection.
+    status (int): The HTTP status code.
+    payload (dict): The response body.
+    keep_alive (bool, optional): Keep the connection open for the next request. Defaults to True.
+
+    Returns:
+    None
+    """
+    body = json.dumps(payload).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n")
+    if status == 503:
+        head += "Retry-After: 1\r\n"
+    writer.write(head.encode('latin-1') + b'\r\n' + body)
+
+
+class ExtractionService:
+    """
+    Extracts PDFs on request in a pool of worker processes started and warmed once.
+
+    Requests are queued and handed to the pool in batches: while every worker is busy, requests queue up,
+    and the next worker to become free takes them, up to batch_size, in one task. At most max_in_flight
+    batches run at once and at most max_pending extractions are queued or running; requests for further
+    content are refused with 503. Results are cached by the SHA-256 of the PDF content, and concurrent
+    requests for the same content share one extraction.
+
+    Attributes:
+    workers (int): Number of worker processes.
+    batch_size (int): Most requests handed to a worker in one task.
+    batch_window (float): Seconds the last free worker waits for more requests to fill its batch.
+    max_in_flight (int): Batches running at once.
+    max_pending (int): Extractions queued or running before requests for new content are refused.
+    timeout (float): Seconds a request waits for its result before it is answered with 504.
+    max_upload (int): The largest accepted request body in bytes.
+    roots (list of str): Directories path requests may read from.
+    ocr (bool): OCR the pages pypdf cannot extract text from.
+    classify_pages (int): The number of leading pages searched for the type markers, or None.
+    spool_dir (str): Where uploads are written for the workers; a temporary directory removed on close()
+    unless given.
+    """
+
+    def __init__(self, workers=None, batch_size=8, batch_window=0.005, max_in_flight=None, max_pending=256,
+                 cache_entries=1024, timeout=60.0, roots=None, ocr=False, classify_pages=Extraction.CLASSIFY_PAGES,
+                 max_upload=64 * 1024 * 1024, spool_dir=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_in_flight = max_in_flight or self.workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_upload = max_upload
+        self.roots = [os.path.realpath(root) for root in roots or []]
+        self.ocr = ocr
+        self.classify_pages = classify_pages
+        self.spool_dir = spool_dir
+        self._own_spool_dir = spool_dir is None
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()  # (digest, ocr, classify_pages) -> result of extract_batch()
+        self._running = {}  # cache key -> future of the extraction
+        self._queue = None
+        self._slots = None
+        self._pool = None
+        self._dispatcher = None
+        self._latencies = deque(maxlen=10000)
+        self.counters = {"requests": 0, "cache_hits": 0, "coalesced": 0, "extracted": 0, "batches": 0,
+                         "refused": 0, "timeouts": 0, "errors": 0}
+
+    async def start(self):
+        """
+        Starts the worker pool, waits until every worker has imported its libraries, and starts dispatching.
+
+        Returns:
+        None
+        """
+        loop = asyncio.get_running_loop()
+        if self._own_spool_dir:
+            self.spool_dir = tempfile.mkdtemp(prefix="extraction-service-")
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+        await asyncio.gather(*(loop.run_in_executor(self._pool, os.getpid) for _ in range(self.workers)))
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self):
+        """
+        Stops dispatching and shuts the worker pool down.
+
+        Returns:
+        None
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._own_spool_dir and self.spool_dir is not None:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            # Only batch once every worker is busy; while some are idle each request gets its own worker.
+            while len(batch) < self.batch_size and self._slots.locked():
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        self.counters["batches"] += 1
+        pool = self._pool
+        try:
+            jobs = [(file_path, self.ocr, self.classify_pages) for file_path, _ in batch]
+            results = await loop.run_in_executor(pool, extract_batch, jobs)
+        except BrokenProcessPool as e:
+            # A worker died; replace the pool so later requests still have workers. Batches that were
+            # running on the same pool fail too, and only the first of them replaces it.
+            if self._pool is pool:
+                print(f"Warning: Worker pool broke ({e}); restarting it")
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+            results = [{"type": None, "tables": {}, "error": "worker process died"}] * len(batch)
+        except Exception as e:
+            results = [{"type": None, "tables": {}, "error": f"{type(e).__name__}: {e}"}] * len(batch)
+        finally:
+            self._slots.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def extract(self, file_path=None, data=None):
+        """
+        Extracts a PDF, from the cache when its content was extracted before.
+
+        Parameters:
+        file_path (str, optional): The path of the PDF, for path requests.
+        data (bytes, optional): The PDF content, for uploads.
+
+        Returns:
+        tuple: The content digest, whether the result came from the cache, and a dict with the detected
+        "type", the extracted "tables" and the "error", None on success.
+        """
+        loop = asyncio.get_running_loop()
+        if data is not None:
+            digest = await loop.run_in_executor(None, lambda: hashlib.sha256(data).hexdigest())
+        else:
+            digest = await loop.run_in_executor(None, file_digest, file_path)
+        key = (digest, self.ocr, self.classify_pages)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.counters["cache_hits"] += 1
+            return digest, True, cached
+
+        future = self._running.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+        else:
+            if len(self._running) >= self.max_pending:
+                self.counters["refused"] += 1
+                raise HttpError(503, "too many pending requests")
+            future = loop.create_future()
+            self._running[key] = future
+            asyncio.create_task(self._extract(key, file_path, data, future))
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise HttpError(504, f"no result after {self.timeout:g}s; retry to pick it up from the cache")
+        return digest, False, result
+
+    async def _extract(self, key, file_path, data, future):
+        loop = asyncio.get_running_loop()
+        spooled = None
+        try:
+            if data is not None:
+                spooled = os.path.join(self.spool_dir, f"{key[0]}.pdf")
+                await loop.run_in_executor(None, _write_file, spooled, data)
+                file_path = spooled
+            job_future = loop.create_future()
+            await self._queue.put((file_path, job_future))
+            result = await job_future
+            self.counters["extracted"] += 1
+            if result["error"] is None:
+                self._cache[key] = result
+                if len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+            future.set_result(result)
+        except Exception as e:
+            future.set_result({"type": None, "tables": {}, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            del self._running[key]
+            if spooled is not None and os.path.exists(spooled):
+                os.remove(spooled)
+
+    def allowed(self, file_path):
+        """
+        Checks that a path request stays inside the allowed roots.
+
+        Parameters:
+        file_path (str): The requested path.
+
+        Returns:
+        bool: True if the real path of the file is under one of the roots.
+        """
+        real_path = os.path.realpath(file_path)
+        return any(os.path.commonpath([root, real_path]) == root for root in self.roots)
+
+    async def handle_extract(self, query, headers, body):
+        """
+        Answers POST /extract. The body is either the PDF itself, with the year, model and name in the
+        query string, or a JSON object {"path": ..., "year": ..., "model": ...} naming a PDF under one of the
+        roots.
+
+        Parameters:
+        query (dict): The parsed query string.
+        headers (dict): The lower-cased request headers.
+        body (bytes): The request body.
+
+        Returns:
+        tuple: The HTTP status and the response: the "file_path", "sha256", document "type", whether the
+        result was "cached", and the "records" as returned by Extraction.iter_records().
+        """
+        if headers.get('content-type', '').startswith('application/json'):
+            try:
+                request = json.loads(body)
+                file_path = request["path"]
+            except (ValueError, KeyError, TypeError):
+                raise HttpError(400, 'expected {"path": ...}')
+            if not self.allowed(file_path):
+                raise HttpError(403, "path outside the allowed roots")
+            if not os.path.isfile(file_path):
+                raise HttpError(404, "no such file")
+            digest, cached, result = await self.extract(file_path=file_path)
+            name = file_path
+        else:
+            if not body:
+                raise HttpError(400, "empty body; send the PDF or a JSON path request")
+            request = {key: values[0] for key, values in query.items()}
+            digest, cached, result = await self.extract(data=body)
+            name = request.get("name", "upload.pdf")
+
+        year, model = str(request.get("year", "")), str(request.get("model", ""))
+        response = {"file_path": name, "sha256": digest, "type": result["type"], "cached": cached}
+        if result["error"] is not None:
+            self.counters["errors"] += 1
+            response["error"] = result["error"]
+            return 422, response
+        tables = Fingerprint.retag(result["tables"], year, model, name)
+        response["records"] = list(Extraction.iter_records({"tables": tables}))
+        return 200, response
+
+    def status(self):
+        """
+        Answers GET /health.
+
+        Returns:
+        dict: The pool size, queue length, cache size, counters and request latencies.
+        """
+        return {
+            "workers": self.workers, "pending": self._queue.qsize(), "running": len(self._running),
+            "cached": len(self._cache), **self.counters, "latency_ms": percentiles(list(self._latencies)),
+        }
+
+    async def handle(self, reader, writer):
+        """
+        Serves the requests of one connection.
+
+        Parameters:
+        reader (asyncio.StreamReader): The read end of the connection.
+        writer (asyncio.StreamWriter): The write end of the connection.
+
+        Returns:
+        None
+        """
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader, self.max_upload)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status, payload = await self.route(method, target, headers, body)
+                except HttpError as e:
+                    # Unread request bytes may be left after 400, 411 and 413, so those close the connection.
+                    status, payload = e.status, {"error": str(e)}
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, target, headers, body):
+        """
+        Dispatches a request to its handler.
+
+        Parameters:
+        method (str): The HTTP method.
+        target (str): The request target, e.g. "/extract?year=2020".
+        headers (dict): The lower-cased request headers.
+        body (bytes): The request body.
+
+        Returns:
+        tuple: The HTTP status and the response.
+        """
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, self.status()
+        if url.path != '/extract':
+            raise HttpError(404, "unknown path; use POST /extract or GET /health")
+        if method != 'POST':
+            raise HttpError(405, "use POST")
+        started = time.perf_counter()
+        self.counters["requests"] += 1
+        try:
+            return await self.handle_extract(parse_qs(url.query), headers, body)
+        finally:
+            self._latencies.append(time.perf_counter() - started)
+
+
+def _write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+async def serve(service, host, port):
+    """
+    Runs the service until SIGINT or SIGTERM.
+
+    Parameters:
+    service (ExtractionService): The service.
+    host (str): The address to listen on.
+    port (int): The port to listen on.
+
+    Returns:
+    None
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await service.start()
+    try:
+        server = await asyncio.start_server(service.handle, host, port, backlog=1024)
+        print(f"Serving on http://{host}:{port} with {service.workers} warm workers")
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve spec and quote extraction over HTTP: POST /extract, GET /health.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Defaults to 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on. Defaults to 8765.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--batch-size", type=int, default=8, help="Most requests handed to a worker at once.")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                        help="Milliseconds a free worker waits for more requests to batch. Defaults to 5.")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Batches running at once. Defaults to the number of workers.")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="Extractions queued or running before new ones are refused with 503. Defaults to 256.")
+    parser.add_argument("--cache-entries", type=int, default=1024, help="Results kept in the cache. Defaults to 1024.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds a request waits for its result.")
+    parser.add_argument("--max-upload-mb", type=int, default=64, help="Largest accepted upload in MiB.")
+    parser.add_argument("--root", action="append", default=None,
+                        help="Directory path requests may read from; may be repeated. Defaults to the input directory.")
+    parser.add_argument("--ocr", action="store_true",
+                        help="OCR the pages without extractable text (needs PyMuPDF and Tesseract).")
+    parser.add_argument("--classify-pages", type=int, default=Extraction.CLASSIFY_PAGES,
+                        help=f"Leading pages searched for the document type markers; 0 searches every page. "
+                             f"Defaults to {Extraction.CLASSIFY_PAGES}.")
+    args = parser.parse_args()
+
+    service = ExtractionService(args.workers, args.batch_size, args.batch_window_ms / 1000, args.max_in_flight,
+                                args.max_pending, args.cache_entries, args.timeout,
+                                args.root or [Extraction.get_input_directory()], args.ocr, args.classify_pages,
+                                args.max_upload_mb * 1024 * 1024)
+    asyncio.run(serve(service, args.host, args.port))
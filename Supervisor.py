@@ -0,0 +1,273 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+import Extraction
+import Metrics
+from Manifest import Manifest
+from ResultStore import SqliteStore
+
+
+def limit_memory(megabytes):
+    """
+    Caps the address space of the current process, so a file that blows up memory fails with a
+    MemoryError instead of exhausting the machine. Only supported where the resource module exists.
+
+    Parameters:
+    megabytes (int): The limit in MiB.
+
+    Returns:
+    None
+    """
+    try:
+        import resource
+    except ImportError:
+        print("Warning: Memory limits are not supported on this platform.")
+        return
+    limit = megabytes * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def run_attempt(connection, model, year, file_path, ocr, excel, classify_pages, reuse, memory_limit):
+    """
+    Worker process entry point: processes one file and sends the result to the supervisor.
+
+    Parameters:
+    connection (Connection): The write end of the pipe to the supervisor.
+    model (str): The model of the item.
+    year (str): The year associated with the file.
+    file_path (str): The path to the PDF file.
+    ocr (bool): OCR the pages pypdf cannot extract text from.
+    excel (bool): Write the per-work-order Excel files.
+    classify_pages (int): The number of leading pages searched for the type markers, or None.
+    reuse (bool): Reuse the tables of documents with the same body, see Extraction.start().
+    memory_limit (int): The memory limit of the process in MiB, or None.
+
+    Returns:
+    None
+    """
+    # The supervisor stops its workers itself; they must not inherit its signal handlers.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit:
+        limit_memory(memory_limit)
+    result = Extraction.process_file(model, year, file_path, ocr, excel, classify_pages, reuse)
+    connection.send(result)
+    connection.close()
+
+
+def dead_letter(file_path, input_dir, dead_letter_dir, reason, attempts):
+    """
+    Moves a file that cannot be processed to the dead-letter folder, keeping its <year>/<model>/ path,
+    and records why next to it in <file name>.json.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    input_dir (str): The input directory the file was found in.
+    dead_letter_dir (str): The dead-letter directory.
+    reason (str): Why the file failed.
+    attempts (int): How many times the file was tried.
+
+    Returns:
+    str: The new path of the file.
+    """
+    destination = os.path.join(dead_letter_dir, os.path.relpath(file_path, input_dir))
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.move(file_path, destination)
+    with open(destination + '.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            "file_path": file_path,
+            "reason": reason,
+            "attempts": attempts,
+            "extractor_version": Extraction.extractor_version(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }, f, indent=2)
+    print(f"Moved {os.path.basename(file_path)} to {destination}: {reason}")
+    return destination
+
+
+def supervise(input_dir, manifest, dead_letter_dir, workers=None, timeout=300.0, memory_limit=2048, retries=2,
+              force=False, metrics_log=None, store=None, rollup=None, ocr=False, excel=True, classify_pages=None,
+              stop_event=None, checkpoint_interval=10.0, reuse=False):
+    """
+    Processes every PDF under input_dir/<year>/<model>/ with each file in its own supervised worker process.
+
+    A worker that runs longer than timeout seconds is killed, and each worker's address space is capped at
+    memory_limit MiB. Timeouts, crashes and memory errors are treated as transient and retried up to
+    retries more times. A file that still fails, or that raises an extraction error, is a poison file:
+    it is moved to dead_letter_dir with the reason recorded. The manifest is saved every
+    checkpoint_interval seconds, so an interrupted run resumes with the files it had not finished.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+    manifest (Manifest): The manifest of processed files; files it lists as current are skipped.
+    dead_letter_dir (str): Where poison files are moved.
+    workers (int, optional): Number of files processed at once. Defaults to the number of CPUs.
+    timeout (float, optional): Seconds a file may take. Defaults to 300.
+    memory_limit (int, optional): Memory limit of each worker in MiB, None for no limit. Defaults to 2048.
+    retries (int, optional): Extra attempts for files that time out, crash or run out of memory. Defaults to 2.
+    force (bool, optional): Reprocess every file even if the manifest lists it as current. Defaults to False.
+    metrics_log (MetricsLog, optional): Where the metrics of every processed file are written. Defaults to None.
+    store (SqliteStore, optional): The consolidated result store. Defaults to None.
+    rollup (RollupWriter, optional): The per-year rollup workbooks. Defaults to None.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    excel (bool, optional): Write the per-work-order Excel files. Defaults to True.
+    classify_pages (int, optional): The number of leading pages searched for the type markers. Defaults to None.
+    stop_event (threading.Event, optional): Set to stop the run; running files are abandoned. Defaults to None.
+    checkpoint_interval (float, optional): Minimum seconds between manifest saves. Defaults to 10.
+    reuse (bool, optional): Reuse the tables of documents with the same body, see Extraction.start(). Ignored
+    with force. Defaults to False.
+
+    Returns:
+    list of dict: The result of every successfully processed file, as returned by Extraction.process_file().
+    """
+    workers = workers or os.cpu_count() or 1
+    reuse = reuse and not force
+    stop_event = stop_event or threading.Event()
+    queue = deque(
+        (year, model, file_path, 1) for year, model, file_path in Extraction.iter_input_files(input_dir)
+        if force or not manifest.is_current(file_path, Extraction.extractor_version())
+    )
+    running = {}  # connection -> (process, (year, model, file_path, attempt), deadline)
+    results = []
+    last_save = time.monotonic()
+
+    def failed(entry, reason, transient):
+        year, model, file_path, attempt = entry
+        if transient and attempt <= retries:
+            print(f"Retrying {os.path.basename(file_path)} ({reason})")
+            queue.append((year, model, file_path, attempt + 1))
+        elif not os.path.exists(file_path):
+            print(f"Skipping {os.path.basename(file_path)}: it was removed ({reason})")
+        else:
+            dead_letter(file_path, input_dir, dead_letter_dir, reason, attempt)
+
+    try:
+        while (queue or running) and not stop_event.is_set():
+            while queue and len(running) < workers:
+                entry = queue.popleft()
+                year, model, file_path, _ = entry
+                reader, writer = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=run_attempt,
+                    args=(writer, model, year, file_path, ocr, excel, classify_pages, reuse, memory_limit),
+                    daemon=True,
+                )
+                process.start()
+                writer.close()
+                running[reader] = (process, entry, time.monotonic() + timeout)
+
+            next_deadline = min(deadline for _, _, deadline in running.values())
+            ready = wait(list(running), timeout=max(0.0, min(next_deadline - time.monotonic(), 1.0)))
+            now = time.monotonic()
+
+            for connection in list(running):
+                process, entry, deadline = running[connection]
+                if connection in ready:
+                    try:
+                        result = connection.recv()
+                    except EOFError:
+                        result = None
+                    process.join()
+                elif now >= deadline:
+                    process.kill()
+                    process.join()
+                    result = None
+                else:
+                    continue
+                del running[connection]
+                connection.close()
+
+                if result is None:
+                    if now >= deadline:
+                        failed(entry, f"timed out after {timeout:g}s", True)
+                    else:
+                        failed(entry, f"worker exited with code {process.exitcode}", True)
+                    continue
+                if metrics_log is not None:
+                    metrics_log.write(result["metrics"])
+                if "error" in result:
+                    failed(entry, result["error"], result["error"].startswith("MemoryError"))
+                    continue
+                results.append(result)
+                if store is not None:
+                    store.write(result)
+                if rollup is not None:
+                    rollup.write(result)
+                Extraction.record_result(manifest, result, store)
+
+            if time.monotonic() - last_save >= checkpoint_interval:
+                if store is not None:
+                    store.flush()
+                manifest.save()
+                last_save = time.monotonic()
+    finally:
+        for connection, (process, _, _) in running.items():
+            process.kill()
+            process.join()
+            connection.close()
+        if store is not None:
+            store.flush()
+        manifest.save()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract inputs/<year>/<model>/*.pdf with per-file timeouts, memory limits and retries."
+    )
+    parser.add_argument("--input-dir", default=None, help="Input directory. Defaults to 'inputs' next to this script.")
+    parser.add_argument("--dead-letter-dir", default=None,
+                        help="Where files that keep failing are moved. Defaults to 'dead-letter' in the output directory.")
+    parser.add_argument("--workers", type=int, default=None, help="Files processed at once. Defaults to the number of CPUs.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds a file may take before its worker is killed.")
+    parser.add_argument("--memory-limit", type=int, default=2048, help="Memory limit of each worker in MiB; 0 disables it.")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Extra attempts for files that time out, crash or run out of memory.")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess every file, even those the manifest lists as unchanged.")
+    parser.add_argument("--metrics", default=None,
+                        help="JSON lines file for per-file metrics. Defaults to 'metrics.jsonl' in the output directory.")
+    parser.add_argument("--ocr", action="store_true",
+                        help="OCR the pages without extractable text (needs PyMuPDF and Tesseract).")
+    parser.add_argument("--store", default=None,
+                        help="SQLite result store. Defaults to 'results.sqlite' in the output directory; 'none' disables it.")
+    parser.add_argument("--excel", action="store_true",
+                        help="Also write the per-work-order Spec, Quote and WeightSummary Excel files.")
+    parser.add_argument("--classify-pages", type=int, default=Extraction.CLASSIFY_PAGES,
+                        help=f"Leading pages searched for the document type markers; 0 searches every page. "
+                             f"Defaults to {Extraction.CLASSIFY_PAGES}.")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse the rows of documents whose body was already extracted by the same rules and code "
+                             "(kept in cache/tables). Extracts every page to fingerprint it. Ignored with --force.")
+    args = parser.parse_args()
+
+    input_dir = Extraction.get_input_directory(args.input_dir)
+    if not os.path.exists(input_dir):
+        print(f"Error: The input directory '{input_dir}' does not exist.")
+    else:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+        output_dir = Extraction.get_output_directory()
+        manifest = Manifest(os.path.join(output_dir, 'manifest.json'), input_dir)
+        metrics_log = Metrics.MetricsLog(args.metrics or os.path.join(output_dir, 'metrics.jsonl'))
+        store = None
+        if (args.store or '').lower() != 'none':
+            store = SqliteStore(args.store or os.path.join(output_dir, 'results.sqlite'))
+        try:
+            supervise(input_dir, manifest, args.dead_letter_dir or os.path.join(output_dir, 'dead-letter'),
+                      args.workers, args.timeout, args.memory_limit or None, args.retries, args.force,
+                      metrics_log=metrics_log, store=store, ocr=args.ocr, excel=args.excel,
+                      classify_pages=args.classify_pages, stop_event=stop, reuse=args.reuse)
+        finally:
+            if store is not None:
+                store.close()
+            metrics_log.close()
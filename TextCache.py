@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+import pypdf
+from Manifest import file_digest
+from DiskCache import DiskCache
+
+CACHE_DIR = os.environ.get(
+    "TEXT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'text')
+)
+MAX_BYTES = 1024 * 1024 * 1024
+
+_default_cache = None
+
+
+class TextCache(DiskCache):
+    """
+    Persistent cache of the text pypdf extracts from each page of a PDF, keyed by the SHA-256 of the
+    file and the pypdf version. Entries are gzip-compressed JSON holding the page texts and the
+    document metadata, and are evicted least recently used first (see DiskCache). With the cache
+    warm, re-running the extraction rules over an archive does not parse any PDF again.
+
+    Attributes:
+    directory (str): The cache directory.
+    max_bytes (int): The size the cache is trimmed back to.
+    """
+
+    suffix = '.json.gz'
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def key(file_path):
+        """
+        Computes the cache key of a PDF file.
+
+        Parameters:
+        file_path (str): The path to the PDF file.
+
+        Returns:
+        str: The SHA-256 of the file contents followed by the pypdf version.
+        """
+        return f"{file_digest(file_path)}-pypdf{pypdf.__version__}"
+
+    def encode(self, value):
+        """
+        Compresses a cache entry.
+
+        Parameters:
+        value (dict): The "pages" (list of str) and "metadata" (dict) of a document.
+
+        Returns:
+        bytes: The gzip-compressed JSON.
+        """
+        return gzip.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'), compresslevel=6)
+
+    def decode(self, data):
+        """
+        Decompresses a cache entry.
+
+        Parameters:
+        data (bytes): The stored bytes.
+
+        Returns:
+        dict: The "pages" and "metadata" of the document.
+        """
+        return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+def get_default_cache():
+    """
+    Returns the extracted-text cache of this process, opening it on first use.
+
+    Returns:
+    TextCache: The cache in CACHE_DIR.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TextCache()
+    return _default_cache
@@ -0,0 +1,221 @@
+import argparse
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import Extraction
+import Metrics
+from Manifest import Manifest
+from Profiles import get_registry
+from ResultStore import SqliteStore
+
+
+def warm_up():
+    """
+    Worker initializer: imports the PDF and Excel libraries and compiles the profiles before the first
+    file arrives, so a new PDF only pays for its own extraction.
+
+    Returns:
+    None
+    """
+    import pypdf  # noqa: F401
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    get_registry()
+
+
+def scan(input_dir):
+    """
+    Lists the PDFs under input_dir/<year>/<model>/ with their size and modification time.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+
+    Returns:
+    generator: Tuples of (year, model, file_path, size, mtime_ns).
+    """
+    with os.scandir(input_dir) as years:
+        for year in years:
+            if not year.is_dir():
+                continue
+            with os.scandir(year.path) as models:
+                for model in models:
+                    if not model.is_dir():
+                        continue
+                    with os.scandir(model.path) as files:
+                        for file in files:
+                            if file.is_file() and file.name.lower().endswith('.pdf'):
+                                stat = file.stat()
+                                yield year.name, model.name, file.path, stat.st_size, stat.st_mtime_ns
+
+
+def watch(input_dir, manifest, workers=None, interval=1.0, settle=2.0, max_in_flight=None, max_pending=10000,
+          metrics_log=None, ocr=False, stop_event=None, save_interval=30.0, store=None, excel=True,
+          classify_pages=None, reuse=False):
+    """
+    Watches input_dir/<year>/<model>/ and extracts new or modified PDFs as they arrive.
+
+    The folder is polled every interval seconds. A file is only queued once its size and modification
+    time have not changed for settle seconds, so partially copied files are left alone. Stable files are
+    handed to a pre-warmed pool of worker processes, with at most max_in_flight files submitted at a time;
+    files beyond that (and beyond max_pending tracked files) simply stay on disk until the pool catches
+    up, so a bulk drop of thousands of files does not build an unbounded queue in memory.
+
+    Parameters:
+    input_dir (str): The input directory containing one folder per year.
+    manifest (Manifest): The manifest of processed files; files it lists as current are ignored.
+    workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+    interval (float, optional): Seconds between scans. Defaults to 1.0.
+    settle (float, optional): Seconds a file must stay unchanged before it is processed. Defaults to 2.0.
+    max_in_flight (int, optional): Files submitted to the pool at once. Defaults to twice the workers.
+    max_pending (int, optional): New files tracked while they settle. Defaults to 10000.
+    metrics_log (MetricsLog, optional): Where the metrics of every processed file are written. Defaults to None.
+    ocr (bool, optional): OCR the pages pypdf cannot extract text from. Defaults to False.
+    stop_event (threading.Event, optional): Set to stop watching. Defaults to None, which watches until interrupted.
+    save_interval (float, optional): Minimum seconds between manifest saves. Defaults to 30.0.
+    store (SqliteStore, optional): The consolidated result store, committed as each batch of files
+    completes. Defaults to None.
+    excel (bool, optional): Write the per-work-order Excel files. Defaults to True.
+    classify_pages (int, optional): The number of leading pages searched for the type markers. Defaults to None.
+    reuse (bool, optional): Reuse the tables of documents with the same body, see Extraction.start(). Defaults to False.
+
+    Returns:
+    None
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    stop_event = stop_event or threading.Event()
+
+    pending = {}    # file_path -> (year, model, size, mtime_ns, time the file last changed)
+    failed = {}     # file_path -> (size, mtime_ns) of a version that failed, not retried until it changes
+    in_flight = {}  # future -> (file_path, size, mtime_ns)
+    last_save = time.monotonic()
+    dirty = False
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as executor:
+        try:
+            while not stop_event.is_set():
+                now = time.monotonic()
+                busy = {file_path for file_path, _, _ in in_flight.values()}
+                seen = set()
+                for year, model, file_path, size, mtime_ns in scan(input_dir):
+                    if file_path in busy or failed.get(file_path) == (size, mtime_ns):
+                        continue
+                    entry = pending.get(file_path)
+                    if entry is None:
+                        if len(pending) >= max_pending or manifest.is_current(file_path, Extraction.extractor_version()):
+                            continue
+                        pending[file_path] = (year, model, size, mtime_ns, now)
+                    elif entry[2:4] != (size, mtime_ns):
+                        pending[file_path] = (year, model, size, mtime_ns, now)
+                    seen.add(file_path)
+                for file_path in list(pending):
+                    if file_path not in seen:
+                        del pending[file_path]
+
+                for file_path, (year, model, size, mtime_ns, changed) in list(pending.items()):
+                    if len(in_flight) >= max_in_flight:
+                        break
+                    if now - changed < settle:
+                        continue
+                    del pending[file_path]
+                    failed.pop(file_path, None)
+                    future = executor.submit(Extraction.process_file, model, year, file_path, ocr, excel,
+                                             classify_pages, reuse)
+                    in_flight[future] = (file_path, size, mtime_ns)
+
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=interval, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    stop_event.wait(interval)
+                for future in done:
+                    file_path, size, mtime_ns = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error processing file {os.path.basename(file_path)}: {e}")
+                        failed[file_path] = (size, mtime_ns)
+                        continue
+                    if "error" in result:
+                        failed[file_path] = (size, mtime_ns)
+                    else:
+                        print(f"Processed {file_path}")
+                    if store is not None:
+                        store.write(result)
+                    Extraction.record_result(manifest, result, store)
+                    if metrics_log is not None:
+                        metrics_log.write(result["metrics"])
+                    dirty = True
+                # Commit the rows of the files that just finished, so readers of the store see them right
+                # away; only the manifest waits for save_interval.
+                if store is not None and done:
+                    store.flush()
+
+                if dirty and time.monotonic() - last_save >= save_interval:
+                    manifest.save()
+                    last_save = time.monotonic()
+                    dirty = False
+        finally:
+            for future in wait(list(in_flight)).done:
+                result = future.result() if future.exception() is None else None
+                if result is not None:
+                    if store is not None:
+                        store.write(result)
+                    Extraction.record_result(manifest, result, store)
+                    if metrics_log is not None:
+                        metrics_log.write(result["metrics"])
+            if store is not None:
+                store.flush()
+            manifest.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch inputs/<year>/<model>/ and extract PDFs as they arrive.")
+    parser.add_argument("--input-dir", default=None, help="Input directory. Defaults to 'inputs' next to this script.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between scans of the input directory.")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Seconds a file must stay unchanged before it is processed.")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Files submitted to the workers at once. Defaults to twice the number of workers.")
+    parser.add_argument("--metrics", default=None,
+                        help="JSON lines file for per-file metrics. Defaults to 'metrics.jsonl' in the output directory.")
+    parser.add_argument("--ocr", action="store_true",
+                        help="OCR the pages without extractable text (needs PyMuPDF and Tesseract).")
+    parser.add_argument("--store", default=None,
+                        help="SQLite result store. Defaults to 'results.sqlite' in the output directory; 'none' disables it.")
+    parser.add_argument("--excel", action="store_true",
+                        help="Also write the per-work-order Spec, Quote and WeightSummary Excel files.")
+    parser.add_argument("--classify-pages", type=int, default=Extraction.CLASSIFY_PAGES,
+                        help=f"Leading pages searched for the document type markers; 0 searches every page. "
+                             f"Defaults to {Extraction.CLASSIFY_PAGES}.")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse the rows of documents whose body was already extracted by the same rules and code "
+                             "(kept in cache/tables). Extracts every page to fingerprint it.")
+    args = parser.parse_args()
+
+    input_dir = Extraction.get_input_directory(args.input_dir)
+    if not os.path.exists(input_dir):
+        print(f"Error: The input directory '{input_dir}' does not exist.")
+    else:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+        output_dir = Extraction.get_output_directory()
+        manifest = Manifest(os.path.join(output_dir, 'manifest.json'), input_dir)
+        metrics_log = Metrics.MetricsLog(args.metrics or os.path.join(output_dir, 'metrics.jsonl'))
+        store = None
+        if (args.store or '').lower() != 'none':
+            store = SqliteStore(args.store or os.path.join(output_dir, 'results.sqlite'))
+        print(f"Watching {input_dir}")
+        try:
+            watch(input_dir, manifest, args.workers, args.interval, args.settle, args.max_in_flight,
+                  metrics_log=metrics_log, ocr=args.ocr, stop_event=stop, store=store, excel=args.excel,
+                  classify_pages=args.classify_pages, reuse=args.reuse)
+        finally:
+            if store is not None:
+                store.close()
+            metrics_log.close()